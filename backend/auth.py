@@ -0,0 +1,101 @@
+"""Request authentication for the conversion endpoints.
+
+Clients send the JWT issued by the auth service (``backend-auth``) as a
+bearer token. Verifying it on every request is a full HMAC check plus JSON
+decoding, so ``Authenticator`` keeps a bounded LRU cache from token to the
+identity it carries; an entry lives for ``AUTH_CACHE_TTL`` seconds at most
+and never past the token's own ``exp``. Requests without a valid token fall
+back to the ``x-user-email`` header, as before.
+
+Only the resolved email and id are logged, never the token or its claims.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional, Tuple
+
+import jwt
+from fastapi import Request
+
+from config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, JWT_ALGORITHMS, JWT_SECRET
+
+logger = logging.getLogger(__name__)
+
+
+class Identity(NamedTuple):
+    email: str
+    user_id: Optional[int]
+
+
+ANONYMOUS = Identity("anonymous", None)
+
+
+def _user_id(claims: dict) -> Optional[int]:
+    value = claims.get("userId") or claims.get("id")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Authenticator:
+    def __init__(
+        self,
+        secret: str = JWT_SECRET,
+        algorithms: Tuple[str, ...] = JWT_ALGORITHMS,
+        cache_size: int = AUTH_CACHE_SIZE,
+        cache_ttl: float = AUTH_CACHE_TTL,
+        on_verified: Optional[Callable[[Identity], None]] = None,
+    ):
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.on_verified = on_verified
+        # token -> (identity, expiry on the time.time() clock), least recently used first
+        self._cache: "OrderedDict[str, Tuple[Identity, float]]" = OrderedDict()
+
+    def verify(self, token: str) -> Optional[Identity]:
+        """The identity of a valid ``token``, or None if it does not verify."""
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is not None:
+            if cached[1] > now:
+                self._cache.move_to_end(token)
+                return cached[0]
+            del self._cache[token]
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        except jwt.PyJWTError as e:
+            logger.warning(f"JWT verification failed: {str(e)}")
+            return None
+        identity = Identity(claims.get("email") or "anonymous", _user_id(claims))
+        if self.on_verified is not None:
+            self.on_verified(identity)
+        expires = now + self.cache_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires = min(expires, claims["exp"])
+        if self.cache_size > 0:
+            self._cache[token] = (identity, expires)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return identity
+
+    def identify(self, request: Request) -> Identity:
+        """Resolve the requesting user from the bearer token or the x-user-email header."""
+        auth_header = request.headers.get("authorization")
+        if auth_header and auth_header.startswith("Bearer ") and self.secret:
+            identity = self.verify(auth_header[len("Bearer "):].strip())
+            if identity is not None:
+                return identity
+        email_header = request.headers.get("x-user-email")
+        if email_header:
+            return Identity(email_header, None)
+        return ANONYMOUS
+
+    async def __call__(self, request: Request) -> Identity:
+        # FastAPI dependency; async so it runs on the event loop, which also
+        # keeps the cache single-threaded
+        identity = self.identify(request)
+        logger.debug(f"User identification: email={identity.email}, id={identity.user_id}")
+        return identity
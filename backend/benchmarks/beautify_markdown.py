@@ -0,0 +1,71 @@
+"""Check beautify_markdown against its golden files and measure throughput.
+
+    python benchmarks/beautify_markdown.py --size-mb 2
+    python benchmarks/beautify_markdown.py --regenerate
+
+``markdown_golden/<name>.input.md`` holds the inputs and
+``<name>.expected.md`` the exact expected output. The throughput run feeds
+the whole corpus, repeated up to ``--size-mb``, through the post-processor
+and reports lines/sec. ``--regenerate`` rewrites the expected files from
+the current implementation; only use it for intended behaviour changes.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_utils import beautify_markdown  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "markdown_golden")
+
+
+def read(path: str) -> str:
+    # newline='' keeps \r and friends, which splitlines() treats as line breaks
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def golden_cases():
+    for name in sorted(os.listdir(GOLDEN_DIR)):
+        if name.endswith(".input.md"):
+            path = os.path.join(GOLDEN_DIR, name)
+            yield name[:-len(".input.md")], path, path[:-len(".input.md")] + ".expected.md"
+
+
+def check_golden(regenerate: bool) -> bool:
+    ok = True
+    for name, input_path, expected_path in golden_cases():
+        output = beautify_markdown(read(input_path))
+        if regenerate:
+            with open(expected_path, "w", encoding="utf-8", newline="") as f:
+                f.write(output)
+            print(f"regenerated {name}")
+        elif output != read(expected_path):
+            ok = False
+            print(f"MISMATCH {name}")
+    return ok
+
+
+def main(args):
+    if not check_golden(args.regenerate):
+        sys.exit(1)
+    corpus = "\n".join(read(input_path) for _, input_path, _ in golden_cases())
+    document = corpus * max(1, int(args.size_mb * 1024 * 1024 / max(1, len(corpus))))
+    lines = len(document.splitlines())
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        beautify_markdown(document)
+        best = min(best, time.perf_counter() - start)
+    print(f"golden files ok; {len(document) / 1e6:.1f} MB, {lines} lines in {best:.3f}s "
+          f"= {lines / best:,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--regenerate", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,151 @@
+"""Synthetic documents for the benchmarks.
+
+    python benchmarks/corpus.py --out /tmp/corpus --pages 10 50 200 --columns 1 2 --images-per-page 0 4
+
+``make_pdf`` and ``make_docx`` build documents with a configurable number of
+pages, images per page and (for PDFs) text columns; ``make_markdown``
+builds LLM-style markdown for the post-processing benchmarks. The content
+is deterministic for a given set of arguments.
+"""
+import argparse
+import io
+import os
+import random
+
+import fitz  # PyMuPDF
+from docx import Document
+from docx.shared import Inches
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+    "et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _pixmap(seed: int) -> fitz.Pixmap:
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), 0)
+    pixmap.clear_with(seed % 256)
+    return pixmap
+
+
+def make_pdf(pages: int, images_per_page: int = 1, columns: int = 1, unique_images: bool = False, seed: int = 0) -> bytes:
+    """Build a text-heavy PDF.
+
+    With the defaults every page has a title, 40 lines of text and one
+    (shared) embedded image. ``columns`` > 1 lays the text out in columns
+    of paragraphs; ``unique_images`` gives every image distinct content so
+    the image store cannot deduplicate them.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    shared = _pixmap(180)
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Section {page_num + 1}", fontsize=18)
+        if columns <= 1:
+            for line in range(40):
+                page.insert_text((72, 90 + line * 16), f"Line {line} of page {page_num + 1}: lorem ipsum dolor sit amet " * 2, fontsize=9)
+        else:
+            gutter = 18
+            width = (page.rect.width - 144 - gutter * (columns - 1)) / columns
+            for column in range(columns):
+                x0 = 72 + column * (width + gutter)
+                y = 90
+                while y < page.rect.height - 160:
+                    height = rng.choice((50, 70, 90))
+                    page.insert_textbox(fitz.Rect(x0, y, x0 + width, y + height), _sentence(rng, height // 3), fontsize=9)
+                    y += height + 10
+        for image in range(images_per_page):
+            pixmap = _pixmap(page_num * images_per_page + image) if unique_images else shared
+            if columns <= 1 and image == 0:
+                rect = fitz.Rect(400, 40, 480, 120)
+            else:
+                x0 = 72 + (image % 5) * 90
+                y0 = page.rect.height - 150 + (image // 5) * 40
+                rect = fitz.Rect(x0, y0, x0 + 80, y0 + 36)
+            page.insert_image(rect, pixmap=pixmap)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(pages: int, images_per_page: int = 1, unique_images: bool = False, seed: int = 0) -> bytes:
+    """Build a DOCX with headings, paragraphs, lists, a table and images per page."""
+    rng = random.Random(seed)
+    doc = Document()
+    shared = _pixmap(180).tobytes("png")
+    for page_num in range(pages):
+        doc.add_heading(f"Section {page_num + 1}", level=1)
+        for _ in range(6):
+            doc.add_paragraph(" ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(4)))
+        for item in range(4):
+            doc.add_paragraph(f"Item {item + 1}: {_sentence(rng, 6)}", style="List Bullet")
+        table = doc.add_table(rows=3, cols=3)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = rng.choice(WORDS)
+        for image in range(images_per_page):
+            png = _pixmap(page_num * images_per_page + image).tobytes("png") if unique_images else shared
+            doc.add_picture(io.BytesIO(png), width=Inches(1))
+        if page_num < pages - 1:
+            doc.add_page_break()
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_markdown(lines: int, seed: int = 0) -> str:
+    """Build LLM-style markdown: headings, paragraphs, lists, code, images and stray backticks."""
+    rng = random.Random(seed)
+    out = []
+    while len(out) < lines:
+        kind = rng.random()
+        if kind < 0.08:
+            out.extend([f"## {_sentence(rng, 4)[:-1]}", ""])
+        elif kind < 0.35:
+            out.extend([_sentence(rng, rng.randint(10, 30)) for _ in range(rng.randint(1, 3))] + [""])
+        elif kind < 0.6:
+            indent = ""
+            for item in range(rng.randint(2, 6)):
+                marker = rng.choice(("-", "*", "•", f"{item + 1}.", f"{item + 1})"))
+                out.append(f"{indent}{marker} {_sentence(rng, rng.randint(4, 12))}")
+                indent = rng.choice(("", "  ", "    ")) if marker in "-*•" else ""
+            out.append("")
+        elif kind < 0.7:
+            out.extend(["```python", "def f(x):", "    return `x` * 2", "```", ""])
+        elif kind < 0.85:
+            digest = f"{rng.getrandbits(256):064x}"
+            out.extend([f"![](http://localhost:5000/uploads/{digest[:2]}/{digest[2:4]}/{digest}.png)", ""])
+        else:
+            out.extend([f"    `{rng.choice(WORDS)}` {_sentence(rng, 8)}", ""])
+    return "\n".join(out[:lines]) + "\n"
+
+
+def main(args):
+    os.makedirs(args.out, exist_ok=True)
+    for pages in args.pages:
+        for images in args.images_per_page:
+            for columns in args.columns:
+                name = f"p{pages}_i{images}_c{columns}"
+                with open(os.path.join(args.out, f"{name}.pdf"), "wb") as f:
+                    f.write(make_pdf(pages, images, columns, unique_images=args.unique_images, seed=args.seed))
+                print(f"wrote {name}.pdf")
+            name = f"p{pages}_i{images}"
+            with open(os.path.join(args.out, f"{name}.docx"), "wb") as f:
+                f.write(make_docx(pages, images, unique_images=args.unique_images, seed=args.seed))
+            print(f"wrote {name}.docx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--images-per-page", type=int, nargs="+", default=[1])
+    parser.add_argument("--columns", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--unique-images", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,71 @@
+"""Measure /api/health latency while large conversions are running.
+
+Start the backend first (``python app.py``), then run:
+
+    python benchmarks/health_latency.py --pages 200 --concurrency 4
+
+The script generates a synthetic PDF, samples ``/api/health`` on its own to
+get a baseline, then samples it again while ``--concurrency`` conversions of
+that PDF are in flight. With extraction running in the worker pool the two
+latency distributions should be nearly identical.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from corpus import make_pdf
+
+
+def summarize(label: str, samples: list) -> None:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<22} n={len(samples):<5} p50={statistics.median(samples) * 1000:7.1f}ms "
+          f"p99={p99 * 1000:7.1f}ms max={samples[-1] * 1000:7.1f}ms")
+
+
+async def sample_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/health")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def convert(client: httpx.AsyncClient, pdf: bytes, index: int) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/convert", files={"file": (f"bench_{index}.pdf", pdf, "application/pdf")})
+    elapsed = time.perf_counter() - start
+    print(f"conversion {index}: HTTP {response.status_code} in {elapsed:.1f}s")
+    return elapsed
+
+
+async def main(args):
+    pdf = make_pdf(args.pages)
+    print(f"Generated {args.pages}-page PDF ({len(pdf) / 1024:.0f} KiB)")
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        stop = asyncio.Event()
+        idle = asyncio.create_task(sample_health(client, stop, args.interval))
+        await asyncio.sleep(args.baseline)
+        stop.set()
+        summarize("health (idle)", await idle)
+
+        stop = asyncio.Event()
+        loaded = asyncio.create_task(sample_health(client, stop, args.interval))
+        await asyncio.gather(*(convert(client, pdf, i) for i in range(args.concurrency)))
+        stop.set()
+        summarize("health (under load)", await loaded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between health probes")
+    parser.add_argument("--baseline", type=float, default=5.0, help="seconds of idle sampling")
+    asyncio.run(main(parser.parse_args()))
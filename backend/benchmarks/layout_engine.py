@@ -0,0 +1,110 @@
+"""Microbenchmark the layout engine against the original per-element loop.
+
+    python benchmarks/layout_engine.py --elements 20 200 2000 --pages 200
+
+Generates synthetic pages of randomly placed text blocks and of text
+columns. Checks that the vectorized engine (with column detection off)
+orders them exactly like the original sort-and-group loop, and that
+``page_reading_order`` orders them exactly like the vectorized engine with
+column detection on. Prints the per-page time of each; ``default`` is what
+extraction runs with the default settings (``page_reading_order`` from
+tuples, columns on).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import layout  # noqa: E402
+
+
+def legacy_reading_order(elements):
+    """The loop ``_extract_pdf_page`` used before the layout engine."""
+    elements = [dict(element, index=i) for i, element in enumerate(elements)]
+    elements.sort(key=lambda x: (x['y0'], x['x0']))
+    lines = []
+    current_line = []
+    last_y = -1
+    for element in elements:
+        if current_line and abs(element['y0'] - last_y) > 5:
+            current_line.sort(key=lambda x: x['x0'])
+            lines.append(current_line)
+            current_line = []
+        current_line.append(element)
+        last_y = element['y0']
+    if current_line:
+        current_line.sort(key=lambda x: x['x0'])
+        lines.append(current_line)
+    return [[element['index'] for element in line] for line in lines]
+
+
+def make_page(rng: random.Random, count: int):
+    elements = []
+    for _ in range(count):
+        # Snap to a coarse grid so equal coordinates (and tie-breaking) occur
+        x0 = round(rng.uniform(30, 500), 1 if rng.random() < 0.5 else 0)
+        y0 = round(rng.uniform(30, 780), 1 if rng.random() < 0.5 else 0)
+        elements.append({'x0': x0, 'y0': y0, 'x1': x0 + rng.uniform(5, 80), 'y1': y0 + rng.uniform(8, 14)})
+    return elements
+
+
+def make_column_page(rng: random.Random, count: int):
+    columns = rng.choice((2, 3))
+    width = (470 - 20 * (columns - 1)) / columns
+    elements = [{'x0': 30, 'y0': 40, 'x1': 500, 'y1': 60}]  # a title across the columns
+    for i in range(count - 1):
+        column = i % columns
+        x0 = 30 + column * (width + 20) + rng.choice((0, 0.5, 2))
+        y0 = 70 + (i // columns) * rng.uniform(10, 40) % 700
+        elements.append({'x0': x0, 'y0': y0, 'x1': x0 + width - rng.uniform(0, 40), 'y1': y0 + rng.uniform(8, 30)})
+    rng.shuffle(elements)
+    return elements
+
+
+def bench(fn, pages, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            fn(page)
+        best = min(best, time.perf_counter() - start)
+    return best / len(pages)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    print(f"{'elements':>8} {'legacy':>10} {'numpy':>10} {'+columns':>10} {'default':>10} {'speedup':>8}  identical")
+    for count in args.elements:
+        pages = [make_page(rng, count) for _ in range(args.pages)]
+        tuples = [[(e['x0'], e['y0'], e['x1'], e['y1'], True) for e in page] for page in pages]
+        arrays = [layout.make_boxes(boxes) for boxes in tuples]
+        column_tuples = [
+            [(e['x0'], e['y0'], e['x1'], e['y1'], rng.random() < 0.9) for e in make_column_page(rng, count)]
+            for _ in range(args.pages)
+        ]
+        identical = all(
+            legacy_reading_order(page) == layout.reading_order(boxes, detect_columns=False)
+            for page, boxes in zip(pages, arrays)
+        ) and all(
+            layout.page_reading_order(boxes) == layout.reading_order(layout.make_boxes(boxes))
+            and layout._reading_order_small(boxes, layout.LINE_GAP, True) == layout.reading_order(layout.make_boxes(boxes))
+            for boxes in tuples + column_tuples
+        )
+        legacy = bench(legacy_reading_order, pages, args.repeat)
+        vectorized = bench(lambda boxes: layout.reading_order(boxes, detect_columns=False), arrays, args.repeat)
+        columns = bench(layout.reading_order, arrays, args.repeat)
+        default = bench(layout.page_reading_order, tuples, args.repeat)
+        print(f"{count:>8} {legacy * 1e6:>8.0f}us {vectorized * 1e6:>8.0f}us {columns * 1e6:>8.0f}us {default * 1e6:>8.0f}us "
+              f"{legacy / default:>7.2f}x  {identical}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
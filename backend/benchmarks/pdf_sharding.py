@@ -0,0 +1,64 @@
+"""Compare single-process and page-sharded PDF extraction.
+
+    python benchmarks/pdf_sharding.py --pages 500 --workers 1 2 4 8
+
+Extracts the same synthetic PDF once in-process and then through the worker
+pool with each worker count, checks that the markdown is byte-identical and
+prints the speedup.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Images and indexes go to a scratch directory instead of the real uploads folder
+SCRATCH_DIR = tempfile.mkdtemp(prefix="dokuai-bench-")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(SCRATCH_DIR, "uploads"))
+os.environ.setdefault("CACHE_DIR", os.path.join(SCRATCH_DIR, "cache"))
+
+import extraction  # noqa: E402
+import pipeline  # noqa: E402
+from corpus import make_pdf  # noqa: E402
+from workers import ExtractionPool  # noqa: E402
+
+
+async def sharded(pdf_path: str, workers: int):
+    pool = ExtractionPool(max_workers=workers)
+    try:
+        # Warm the workers up so process start-up is not part of the timing
+        await pool.run_many(len, [((),)] * workers)
+        start = time.perf_counter()
+        result = await pipeline.extract_pdf(pool, pdf_path)
+        return time.perf_counter() - start, result
+    finally:
+        pool.shutdown()
+
+
+def main(args):
+    pdf_path = os.path.join(SCRATCH_DIR, "bench.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(make_pdf(args.pages))
+    try:
+        start = time.perf_counter()
+        baseline = extraction.extract_text_and_images_from_pdf(pdf_path)
+        single = time.perf_counter() - start
+        print(f"{'in-process':<12} {single:7.2f}s  {args.pages / single:7.1f} pages/s")
+
+        for workers in args.workers:
+            elapsed, result = asyncio.run(sharded(pdf_path, workers))
+            identical = result[0] == baseline[0] and result[2] == baseline[2]
+            print(f"{f'{workers} workers':<12} {elapsed:7.2f}s  {args.pages / elapsed:7.1f} pages/s  "
+                  f"speedup {single / elapsed:4.2f}x  identical={identical}")
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 4])
+    main(parser.parse_args())
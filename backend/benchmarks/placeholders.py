@@ -0,0 +1,87 @@
+"""Benchmark placeholder substitution and image reference checks.
+
+    python benchmarks/placeholders.py --images 1000 5000 --paragraphs 20
+
+Builds an image-heavy document (``--paragraphs`` paragraphs of text per
+image) and times the one-replace-per-image loops the pipeline used to run
+against the single-pass versions in ``placeholders``, checking that both
+produce the same output.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import placeholders  # noqa: E402
+from models import PLACEHOLDER_FORMAT, ImageData  # noqa: E402
+
+PARAGRAPH = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore."
+
+
+def make_document(image_count: int, paragraphs: int):
+    images = []
+    parts = []
+    for i in range(image_count):
+        digest = hashlib.sha256(str(i).encode()).hexdigest()
+        url = f"http://localhost:5000/uploads/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        images.append(ImageData(data=url, type="image/png", placeholder=PLACEHOLDER_FORMAT.format(i)))
+        parts.extend([PARAGRAPH] * paragraphs)
+        parts.append(PLACEHOLDER_FORMAT.format(i))
+    return "\n\n".join(parts), images
+
+
+def legacy_round_trip(text, images):
+    for img in images:
+        text = text.replace(img.placeholder, f"![]({img.data})")
+    safe = {}
+    for img in images:
+        placeholder = f"__IMG_PLACEHOLDER_{len(safe)}__"
+        safe[placeholder] = f"![]({img.data})\n"
+        text = text.replace(img.placeholder, placeholder)
+    for placeholder, markdown in safe.items():
+        text = text.replace(placeholder, markdown)
+    return text
+
+
+def single_pass_round_trip(text, images):
+    text = placeholders.substitute(text, {img.placeholder: placeholders.image_markdown(img.data) for img in images})
+    safe = {img.placeholder: placeholders.LLM_PLACEHOLDER_FORMAT.format(i) for i, img in enumerate(images)}
+    text = placeholders.substitute(text, safe)
+    restore = {safe[img.placeholder]: f"{placeholders.image_markdown(img.data)}\n" for img in images}
+    return placeholders.substitute(text, restore, placeholders.LLM_PLACEHOLDER_RE)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(args):
+    print(f"{'images':>7} {'doc MB':>7} {'substitute':>22} {'reference check':>22}  identical")
+    for image_count in args.images:
+        text, images = make_document(image_count, args.paragraphs)
+        urls = [img.data for img in images]
+        # Drop every tenth image from the markdown so the check has work to do
+        markdown = single_pass_round_trip(text, images).replace(f"![]({urls[0]})", "")
+        for url in urls[10::10]:
+            markdown = markdown.replace(f"![]({url})", "")
+
+        legacy_sub, legacy_text = timed(legacy_round_trip, text, images)
+        new_sub, new_text = timed(single_pass_round_trip, text, images)
+        legacy_check, legacy_missing = timed(lambda: [url for url in urls if url not in markdown])
+        new_check, new_missing = timed(placeholders.missing_references, markdown, urls)
+        identical = legacy_text == new_text and legacy_missing == new_missing
+        print(f"{image_count:>7} {len(text) / 1e6:>7.1f} "
+              f"{legacy_sub * 1e3:>8.1f} -> {new_sub * 1e3:>7.1f} ms "
+              f"{legacy_check * 1e3:>8.1f} -> {new_check * 1e3:>7.1f} ms  {identical}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--paragraphs", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+"""A local stand-in for the Groq and OpenAI-compatible chat completions APIs.
+
+    python benchmarks/stub_llm.py --port 8099 --latency 0.2
+
+then start the backend with ``GROQ_BASE_URL=http://127.0.0.1:8099`` and any
+``GROQ_API_KEY``, or with ``LLM_BACKEND=openai`` and
+``OPENAI_BASE_URL=http://127.0.0.1:8099/v1``. Every completion echoes the
+document content of the user prompt back after ``--latency`` seconds, so the
+full conversion path runs without network access, rate limits or token
+costs. ``--error-rate`` answers that share of requests with a 429 or 503
+(from a seeded generator, so runs are repeatable) to exercise retries.
+(``LLM_BACKEND=stub`` gives the same answers without a server.)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import prompt_content  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    rng = random.Random(0)
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = body.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        content = prompt_content(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate:
+            with self.lock:
+                roll = self.rng.random()
+            if roll < self.error_rate:
+                self.send_response(429 if roll < self.error_rate / 2 else 503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port: int = 0, latency: float = 0.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Serve the stub from a daemon thread; the bound port is ``server.server_port``."""
+    handler = type("Handler", (StubHandler,), {"latency": latency, "error_rate": error_rate, "rng": random.Random(0)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429/503")
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.error_rate)
+    print(f"stub LLM listening on http://127.0.0.1:{server.server_port} (latency {args.latency}s, error rate {args.error_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
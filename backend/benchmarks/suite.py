@@ -0,0 +1,249 @@
+"""Benchmark suite: extraction, post-processing and the full endpoint.
+
+    python benchmarks/suite.py --pages 20 --images-per-page 2 --save-baseline bench.json
+    python benchmarks/suite.py --pages 20 --images-per-page 2 --baseline bench.json
+
+Each scenario runs in its own subprocess against a synthetic document from
+``corpus`` and a scratch upload/cache directory:
+
+- ``pdf_extract`` / ``docx_extract``: the in-process extraction functions
+- ``pdf_pool``: PDF extraction sharded over the worker pool
+- ``beautify``: ``beautify_markdown`` on LLM-style markdown
+- ``endpoint_pdf`` / ``endpoint_docx``: ``POST /api/convert`` through the
+  app, with the Groq client pointed at ``stub_llm`` (the result cache, the
+  LLM output cache and the lineage index are off and the conversion log
+  points at an unreachable database)
+
+It reports throughput (pages/s, or lines/s for ``beautify``), p50/p99
+latency over ``--repeat`` runs, peak RSS of the scenario process and its
+worker processes, and the peak of Python allocations (``tracemalloc``,
+measured in a separate run so tracing does not skew the timings; it does
+not see worker processes). ``--baseline`` compares against a file written
+with ``--save-baseline`` and exits with status 1 if any value got worse by
+more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+SCENARIOS = ("pdf_extract", "docx_extract", "pdf_pool", "beautify", "endpoint_pdf", "endpoint_docx")
+
+# Baseline values compared by --baseline; all of them are worse when higher
+COMPARED = ("p50_ms", "p99_ms", "peak_rss_mb", "alloc_peak_mb")
+
+PARAMS = ("pages", "images_per_page", "columns", "unique_images", "markdown_lines", "llm_latency", "repeat")
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def write_file(scratch: str, name: str, data: bytes) -> str:
+    path = os.path.join(scratch, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def prepare(name: str, args, scratch: str, stack: ExitStack):
+    """Return ``(run, units, unit)`` for a scenario; ``run()`` processes the document once.
+
+    Anything that needs shutting down afterwards is registered on ``stack``.
+    """
+    from corpus import make_docx, make_markdown, make_pdf
+
+    if name == "beautify":
+        from markdown_utils import beautify_markdown
+        markdown = make_markdown(args.markdown_lines, args.seed)
+        return (lambda: beautify_markdown(markdown)), args.markdown_lines, "lines"
+
+    if name.endswith("pdf") or name.startswith("pdf"):
+        path = write_file(scratch, "bench.pdf", make_pdf(args.pages, args.images_per_page, args.columns, args.unique_images, args.seed))
+    else:
+        path = write_file(scratch, "bench.docx", make_docx(args.pages, args.images_per_page, args.unique_images, args.seed))
+
+    if name in ("pdf_extract", "docx_extract"):
+        import extraction
+        if name == "pdf_extract":
+            return (lambda: extraction.extract_text_and_images_from_pdf(path)), args.pages, "pages"
+        return (lambda: extraction.extract_text_and_images_from_docx(path, os.path.basename(path))), args.pages, "pages"
+
+    if name == "pdf_pool":
+        import asyncio
+
+        import pipeline
+        from workers import ExtractionPool
+        pool = ExtractionPool()
+        stack.callback(pool.shutdown)
+        loop = asyncio.new_event_loop()
+        stack.callback(loop.close)
+        return (lambda: loop.run_until_complete(pipeline.extract_pdf(pool, path))), args.pages, "pages"
+
+    # endpoint_*: the app reads these when it is imported
+    import stub_llm
+    server = stub_llm.start(latency=args.llm_latency)
+    stack.callback(server.shutdown)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    from fastapi.testclient import TestClient
+
+    from app import app
+    # Entering the client runs the startup hooks; leaving it the shutdown hooks
+    client = stack.enter_context(TestClient(app))
+    with open(path, "rb") as f:
+        data = f.read()
+    filename = os.path.basename(path)
+
+    def run():
+        response = client.post("/api/convert", files={"file": (filename, data)})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/convert returned HTTP {response.status_code}: {response.text[:200]}")
+
+    return run, args.pages, "pages"
+
+
+def run_scenario(name: str, args, stack: ExitStack) -> dict:
+    """Measure one scenario in this process (called in the per-scenario subprocess)."""
+    scratch = os.environ["DOKUAI_BENCH_SCRATCH"]
+    run, units, unit = prepare(name, args, scratch, stack)
+    run()  # warm-up: imports, worker start-up, first-time image writes
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50 = statistics.median(samples)
+    return {
+        "unit": unit,
+        "throughput": units / p50,
+        "p50_ms": p50 * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "alloc_peak_mb": alloc_peak / 2 ** 20,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; children only count once they have been waited for
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def child_main(args):
+    os.chdir(os.environ["DOKUAI_BENCH_SCRATCH"])
+    with ExitStack() as stack:
+        result = run_scenario(args.child, args, stack)
+    # Workers have exited now, so their peak RSS is included
+    result["peak_rss_mb"] = peak_rss_mb()
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+def spawn(name: str, args, scratch: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DOKUAI_BENCH_SCRATCH": scratch,
+        "UPLOAD_DIR": os.path.join(scratch, "uploads"),
+        "CACHE_DIR": os.path.join(scratch, "cache"),
+        "RESULT_CACHE_ENABLED": "false",
+        "LLM_CACHE_TIERS": "",
+        "LINEAGE_ENABLED": "false",
+        "POSTGRES_DSN": "postgresql://bench@127.0.0.1:1/bench",
+        "GROQ_API_KEY": "stub",
+    })
+    command = [sys.executable, os.path.abspath(__file__), "--child", name]
+    for param in PARAMS + ("seed",):
+        value = getattr(args, param)
+        if isinstance(value, bool):
+            command += [f"--{param.replace('_', '-')}"] if value else []
+        else:
+            command += [f"--{param.replace('_', '-')}", str(value)]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{name} failed (exit {completed.returncode}):\n{completed.stderr[-2000:]}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for key in COMPARED:
+            if previous[key] > 0 and result[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {previous[key]:.1f} -> {result[key]:.1f} "
+                                   f"(+{(result[key] / previous[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(args):
+    params = {param: getattr(args, param) for param in PARAMS}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["params"] != params:
+            sys.exit(f"baseline was recorded with different parameters: {baseline['params']}")
+
+    results = {}
+    print(f"{'scenario':<14} {'throughput':>16} {'p50':>10} {'p99':>10} {'peak RSS':>10} {'allocs':>10}")
+    for name in args.scenarios:
+        scratch = tempfile.mkdtemp(prefix="dokuai-bench-")
+        try:
+            result = results[name] = spawn(name, args, scratch)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        print(f"{name:<14} {result['throughput']:>10,.0f} {result['unit'] + '/s':<7}"
+              f"{result['p50_ms']:>8.1f}ms {result['p99_ms']:>8.1f}ms "
+              f"{result['peak_rss_mb']:>8.0f}MB {result['alloc_peak_mb']:>8.1f}MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+        print(f"saved baseline to {args.save_baseline}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--images-per-page", type=int, default=2)
+    parser.add_argument("--columns", type=int, default=1)
+    parser.add_argument("--unique-images", action="store_true")
+    parser.add_argument("--markdown-lines", type=int, default=20000)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub LLM waits per chunk")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown / growth")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child_main(args)
+    else:
+        main(args)
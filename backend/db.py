@@ -0,0 +1,254 @@
+"""PostgreSQL access for the conversion backend.
+
+``Database`` wraps a psycopg2 connection pool and runs queries on worker
+threads so the event loop never blocks on the network. Conversion logging
+goes through ``ConversionLogWriter``, which queues log rows in memory and
+flushes them in batches: one multi-row INSERT per batch, one coalesced
+``last_active`` UPDATE per batch and cached email -> user id lookups.
+"""
+import asyncio
+import logging
+import os
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    def __init__(self, dsn: str, min_connections: int, max_connections: int):
+        self.dsn = dsn
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self._pool: Optional[ThreadedConnectionPool] = None
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            self._pool = ThreadedConnectionPool(self.min_connections, self.max_connections, self.dsn)
+        return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a pooled connection; commits on success, rolls back on error."""
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Broken connections are discarded instead of going back to the pool
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(conn, *args)`` on a worker thread with a pooled connection."""
+        return await asyncio.to_thread(self._call, fn, *args)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+
+# Ensure the conversion_logs table exists
+def ensure_conversion_logs_table(conn):
+    cur = conn.cursor()
+
+    # Create conversion_logs table if it doesn't exist
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS conversion_logs (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES user1(id) ON DELETE SET NULL,
+        user_email VARCHAR(255) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        original_file_name VARCHAR(255),
+        converted_file_name VARCHAR(255),
+        conversion_type VARCHAR(50),
+        status VARCHAR(50) NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Create index for faster lookups
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_conversion_logs_user_email
+    ON conversion_logs(user_email)
+    """)
+    cur.close()
+
+
+# (user_id, user_email, file_name, conversion_type, created_at)
+LogRow = Tuple[Optional[int], str, str, str, float]
+
+
+class ConversionLogWriter:
+    """Batches conversion_logs inserts and last_active updates off the request path."""
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int,
+        flush_interval: float,
+        max_queue: int,
+        user_id_ttl: float,
+        shutdown_timeout: float = 10.0,
+    ):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.user_id_ttl = user_id_ttl
+        self.shutdown_timeout = shutdown_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # The flush in progress; it runs as its own task so stopping the
+        # writer waits for it instead of abandoning the insert mid-way
+        self._flushing: Optional[asyncio.Task] = None
+        # Rows taken off the queue but not yet handed to the database
+        self._batch: List[LogRow] = []
+        # email -> (user id or None, expiry)
+        self._user_ids: Dict[str, Tuple[Optional[int], float]] = {}
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    def record(self, user_email: str, user_id: Optional[int], filename: str):
+        """Queue a completed conversion for logging; never blocks the caller."""
+        if self._queue is None:
+            logger.warning("Conversion log writer is not running, dropping log entry")
+            return
+        row = (
+            user_id,
+            user_email,
+            filename,
+            os.path.splitext(filename)[1].lstrip('.').lower(),  # Extract file extension as conversion_type
+            time.time(),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.error(f"Conversion log queue is full, dropping log entry for {user_email}: {filename}")
+
+    def remember_user(self, user_email: str, user_id: Optional[int]):
+        """Record a known email -> user id mapping (e.g. from a verified token) so it is not looked up."""
+        if user_id is not None:
+            self._user_ids[user_email] = (user_id, time.monotonic() + self.user_id_ttl)
+
+    async def _run(self):
+        while True:
+            self._batch.append(await self._queue.get())
+            # Gather whatever else arrives within the flush interval
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: List[LogRow]):
+        try:
+            known = self._known_user_ids(batch)
+            with metrics.timed("db_log"):
+                looked_up = await self.db.run(self._write_batch, batch, known)
+            expires = time.monotonic() + self.user_id_ttl
+            for email, user_id in looked_up.items():
+                # Unknown emails are cached too so they are not looked up on every flush
+                self._user_ids[email] = (user_id, expires)
+            logger.info(f"Logged {len(batch)} conversions")
+        except Exception as e:
+            logger.error(f"Failed to log {len(batch)} conversions: {str(e)}")
+            logger.error(traceback.format_exc())
+
+    def _known_user_ids(self, batch: List[LogRow]) -> Dict[str, Optional[int]]:
+        """Cached user ids of the emails in ``batch``; expired entries are dropped."""
+        # _user_ids is only touched on the event loop, never by the database threads
+        now = time.monotonic()
+        for email in [email for email, (_, expiry) in self._user_ids.items() if expiry <= now]:
+            del self._user_ids[email]
+        return {email: self._user_ids[email][0] for _, email, _, _, _ in batch if email in self._user_ids}
+
+    def _write_batch(self, conn, batch: List[LogRow], known: Dict[str, Optional[int]]) -> Dict[str, Optional[int]]:
+        """Insert ``batch``; returns the user ids looked up for emails not in ``known``."""
+        cur = conn.cursor()
+
+        # Use user ids from the JWT where available, then known ones, look up the rest by email
+        missing = sorted({
+            email for user_id, email, _, _, _ in batch
+            if not user_id and email != "anonymous" and email not in known
+        })
+        looked_up = {}
+        if missing:
+            cur.execute("SELECT email, id FROM user1 WHERE email = ANY(%s)", (missing,))
+            found = dict(cur.fetchall())
+            looked_up = {email: found.get(email) for email in missing}
+        user_ids = {**known, **looked_up}
+        rows = [
+            (user_id or user_ids.get(email), email, filename, filename, conversion_type, created_at)
+            for user_id, email, filename, conversion_type, created_at in batch
+        ]
+
+        execute_values(
+            cur,
+            """
+            INSERT INTO conversion_logs
+            (user_id, user_email, file_name, original_file_name, conversion_type, status, created_at)
+            VALUES %s
+            """,
+            rows,
+            template="(%s, %s, %s, %s, %s, 'completed', to_timestamp(%s))",
+        )
+
+        # One last_active update per user, however many conversions they ran
+        active_ids = sorted({row[0] for row in rows if row[0]})
+        if active_ids:
+            cur.execute("UPDATE user1 SET last_active = NOW() WHERE id = ANY(%s)", (active_ids,))
+        cur.close()
+        return looked_up
+
+    async def stop(self):
+        """Finish the flush in progress, flush queued entries and stop the background task.
+
+        Call before closing the database, which the flushes still use.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._flushing is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._flushing), self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Conversion log flush still running after {self.shutdown_timeout:g}s, not waiting for it")
+            self._flushing = None
+        batch, self._batch = self._batch, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        for start in range(0, len(batch), self.batch_size):
+            await self._flush(batch[start:start + self.batch_size])
+        self._task = None
+        self._queue = None
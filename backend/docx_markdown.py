@@ -0,0 +1,390 @@
+"""DOCX to markdown in one pass over the document XML.
+
+python-docx's object model is convenient but slow for extraction: every
+element is parsed into a custom Python class, every run is a proxy object,
+and finding a run's images meant serializing it back to XML. ``DocxReader``
+instead reads the package with ``zipfile``, parses the parts it needs with a
+plain lxml parser and walks the body element tree once:
+
+- headings (``Title``, ``Heading 1``-``6`` or an outline level) become ``#``
+  headings
+- numbered and bulleted paragraphs become markdown list items, nested by
+  their list level
+- tables become pipe tables (merged cells are left empty, nested tables are
+  flattened into their cell)
+- images are resolved through an index of each part's image relationships
+  built up front
+
+The text of hyperlinks, tracked insertions, content controls and text boxes
+is kept; the default header and footer of each section are read as well and
+placed before and after the body.
+"""
+import posixpath
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+V = "urn:schemas-microsoft-com:vml"
+MC = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+PACKAGE_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+P = f"{{{W}}}p"
+TBL = f"{{{W}}}tbl"
+SDT = f"{{{W}}}sdt"
+SDT_CONTENT = f"{{{W}}}sdtContent"
+TR = f"{{{W}}}tr"
+TC = f"{{{W}}}tc"
+T = f"{{{W}}}t"
+TAB = f"{{{W}}}tab"
+TABS = f"{{{W}}}tabs"
+BR = f"{{{W}}}br"
+CR = f"{{{W}}}cr"
+BLIP = f"{{{A}}}blip"
+IMAGEDATA = f"{{{V}}}imagedata"
+FALLBACK = f"{{{MC}}}Fallback"
+VAL = f"{{{W}}}val"
+TYPE = f"{{{W}}}type"
+EMBED = f"{{{R}}}embed"
+RID = f"{{{R}}}id"
+
+# Elements that contribute to the text of a paragraph, in document order
+INLINE_TAGS = (T, TAB, BR, CR, BLIP, IMAGEDATA)
+
+NAMESPACES = {"w": W, "r": R}
+
+# Extensions kept for stored images; anything else is stored as .png
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+# Indentation per list level; three spaces nest under both "-" and "1."
+LIST_INDENT = "   "
+
+# Callback saving an image: (part name, extension with dot) -> placeholder.
+# The image bytes are available from ``DocxReader.read_part``.
+SaveImage = Callable[[str, str], str]
+
+_parser = etree.XMLParser(resolve_entities=False, remove_blank_text=True, huge_tree=True)
+
+
+def _attr(element, path: str, attribute: str = VAL) -> Optional[str]:
+    found = element.find(path, NAMESPACES)
+    return None if found is None else found.get(attribute)
+
+
+def _level(value: Optional[str]) -> Optional[int]:
+    return int(value) if value is not None and value.isdigit() else None
+
+
+def _outline_heading(value: Optional[str]) -> Optional[int]:
+    # Outline levels 0-8 are headings 1-9, 9 is body text
+    level = _level(value)
+    return min(level + 1, 6) if level is not None and level < 9 else None
+
+
+def _heading_level(style_name: str) -> Optional[int]:
+    name = style_name.lower()
+    if name == "title":
+        return 1
+    if name.startswith("heading "):
+        level = _level(name[len("heading "):])
+        if level is not None and 1 <= level <= 9:
+            return min(level, 6)
+    return None
+
+
+class _Style:
+    __slots__ = ("heading", "num_id", "ilvl")
+
+    def __init__(self, heading: Optional[int], num_id: Optional[str], ilvl: Optional[int]):
+        self.heading = heading
+        self.num_id = num_id
+        self.ilvl = ilvl
+
+
+def _load_styles(styles) -> Dict[str, _Style]:
+    """Paragraph styles by id, with heading levels and numbering resolved through ``basedOn``."""
+    if styles is None:
+        return {}
+    raw = {}
+    for style in styles.iterfind("w:style[@w:type='paragraph']", NAMESPACES):
+        style_id = style.get(f"{{{W}}}styleId")
+        if style_id is not None:
+            raw[style_id] = (
+                _heading_level(_attr(style, "w:name") or "") or _outline_heading(_attr(style, "w:pPr/w:outlineLvl")),
+                _attr(style, "w:pPr/w:numPr/w:numId"),
+                _level(_attr(style, "w:pPr/w:numPr/w:ilvl")),
+                _attr(style, "w:basedOn"),
+            )
+
+    resolved: Dict[str, _Style] = {}
+
+    def resolve(style_id: str, seen: tuple = ()) -> _Style:
+        if style_id not in resolved:
+            heading, num_id, ilvl, based_on = raw[style_id]
+            parent = _Style(None, None, None)
+            if based_on in raw and based_on not in seen:
+                parent = resolve(based_on, seen + (style_id,))
+            resolved[style_id] = _Style(
+                heading or parent.heading,
+                num_id if num_id is not None else parent.num_id,
+                ilvl if ilvl is not None else parent.ilvl,
+            )
+        return resolved[style_id]
+
+    for style_id in raw:
+        resolve(style_id)
+    return resolved
+
+
+def _load_numbering(numbering) -> Dict[str, Dict[int, bool]]:
+    """Whether each level of each list is ordered, by ``numId``."""
+    if numbering is None:
+        return {}
+    abstract = {}
+    for definition in numbering.iterfind("w:abstractNum", NAMESPACES):
+        levels = {}
+        for level in definition.iterfind("w:lvl", NAMESPACES):
+            ilvl = _level(level.get(f"{{{W}}}ilvl"))
+            if ilvl is not None:
+                levels[ilvl] = _attr(level, "w:numFmt") not in ("bullet", "none", None)
+        abstract[definition.get(f"{{{W}}}abstractNumId")] = levels
+    return {
+        num.get(f"{{{W}}}numId"): abstract.get(_attr(num, "w:abstractNumId"), {})
+        for num in numbering.iterfind("w:num", NAMESPACES)
+    }
+
+
+def _cell_text(text: str) -> str:
+    return text.replace("|", "\\|").replace("\n", "<br>")
+
+
+class DocxReader:
+    """Converts one DOCX file to markdown text with image placeholders.
+
+    Raises ``KeyError`` or ``zipfile.BadZipFile`` / ``lxml.etree.XMLSyntaxError``
+    for files that are not a readable DOCX package.
+    """
+
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path)
+        try:
+            self.main = self._main_part()
+            self.body = self._parse(self.main).find(f"{{{W}}}body")
+            if self.body is None:
+                raise KeyError(f"{self.main} has no body")
+            self.rels = self._rels(self.main)
+            self.styles = _load_styles(self._parse_related("styles"))
+            self.numbering = _load_numbering(self._parse_related("numbering"))
+        except BaseException:
+            self._zip.close()
+            raise
+        # Number of the last item of each list level, for ordered lists
+        self._counters: Dict[str, List[int]] = {}
+        self._save_image: Optional[SaveImage] = None
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_part(self, name: str) -> bytes:
+        return self._zip.read(name)
+
+    def _parse(self, name: str):
+        return etree.fromstring(self._zip.read(name), _parser)
+
+    def _main_part(self) -> str:
+        for rel_type, target in self._rels("").values():
+            if rel_type == "officeDocument":
+                return target
+        return "word/document.xml"
+
+    def _rels(self, part: str) -> Dict[str, Tuple[str, str]]:
+        """Relationships of ``part`` ("" for the package) by rId: (type, target part name).
+
+        The type is the last segment of the relationship type URI, so
+        transitional and strict documents look the same.
+        """
+        directory, name = posixpath.split(part)
+        try:
+            root = self._parse(posixpath.join(directory, "_rels", f"{name}.rels"))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root.iterfind(f"{{{PACKAGE_RELS}}}Relationship"):
+            target = rel.get("Target", "")
+            if rel.get("TargetMode") == "External" or not target:
+                continue
+            if target.startswith("/"):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(directory, target))
+            rels[rel.get("Id")] = (rel.get("Type", "").rsplit("/", 1)[-1], target)
+        return rels
+
+    def _parse_related(self, rel_type: str):
+        for found_type, target in self.rels.values():
+            if found_type == rel_type:
+                try:
+                    return self._parse(target)
+                except KeyError:
+                    return None
+        return None
+
+    def _paragraph_text(self, p, images: Dict[str, str]) -> str:
+        parts = []
+        for element in p.iter(INLINE_TAGS):
+            tag = element.tag
+            if tag == T:
+                if element.text:
+                    parts.append(element.text)
+            elif tag == TAB:
+                # Tab stops in the paragraph properties share the tag
+                if element.getparent().tag != TABS:
+                    parts.append("\t")
+            elif tag == BR:
+                if element.get(TYPE) not in ("page", "column"):
+                    parts.append("\n")
+            elif tag == CR:
+                parts.append("\n")
+            else:
+                name = images.get(element.get(EMBED if tag == BLIP else RID))
+                if name is not None:
+                    ext = posixpath.splitext(name)[1].lower()
+                    parts.append(f" {self._save_image(name, ext if ext in IMAGE_EXTENSIONS else '.png')} ")
+        return "".join(parts)
+
+    def _paragraph(self, p, images: Dict[str, str]) -> Tuple[str, bool]:
+        """Markdown of a paragraph and whether it is a list item."""
+        text = self._paragraph_text(p, images)
+        if not text.strip():
+            return "", False
+        heading = num_id = ilvl = None
+        ppr = p.find(f"{{{W}}}pPr")
+        if ppr is not None:
+            style_id = _attr(ppr, "w:pStyle")
+            style = self.styles.get(style_id) if style_id is not None else None
+            heading = _outline_heading(_attr(ppr, "w:outlineLvl"))
+            num_id = _attr(ppr, "w:numPr/w:numId")
+            ilvl = _level(_attr(ppr, "w:numPr/w:ilvl"))
+            if style is not None:
+                heading = heading or style.heading
+                num_id = num_id if num_id is not None else style.num_id
+                ilvl = ilvl if ilvl is not None else style.ilvl
+
+        if heading:
+            return f"{'#' * heading} {text.strip()}", False
+        # numId 0 removes numbering inherited from the style
+        if num_id in self.numbering:
+            return self._list_item(text.strip(), num_id, ilvl or 0), True
+        return text, False
+
+    def _list_item(self, text: str, num_id: str, ilvl: int) -> str:
+        counters = self._counters.setdefault(num_id, [])
+        del counters[ilvl + 1:]
+        counters.extend([0] * (ilvl + 1 - len(counters)))
+        counters[ilvl] += 1
+        marker = f"{counters[ilvl]}." if self.numbering[num_id].get(ilvl, False) else "-"
+        return f"{LIST_INDENT * ilvl}{marker} {text}"
+
+    def _table(self, tbl, images: Dict[str, str]) -> str:
+        rows = []
+        for tr in tbl.iterchildren(TR):
+            row = []
+            for tc in tr.iterchildren(TC):
+                merge = tc.find("w:tcPr/w:vMerge", NAMESPACES)
+                # Cells continuing a vertical merge repeat the cell above
+                continued = merge is not None and merge.get(VAL) != "restart"
+                row.append("" if continued else _cell_text(self._cell(tc, images)))
+                span = _level(_attr(tc, "w:tcPr/w:gridSpan"))
+                row.extend([""] * ((span or 1) - 1))
+            if row:
+                rows.append(row)
+        if not rows:
+            return ""
+        width = max(len(row) for row in rows)
+        lines = []
+        for row in rows:
+            lines.append("| " + " | ".join(row + [""] * (width - len(row))) + " |")
+            if len(lines) == 1:
+                lines.append("|" + " --- |" * width)
+        return "\n".join(lines)
+
+    def _cell(self, tc, images: Dict[str, str]) -> str:
+        """Plain text of a table cell; nested tables are flattened to their cells' text."""
+        pieces = []
+        for child in tc.iterchildren(P, TBL, SDT):
+            if child.tag == TBL:
+                pieces.extend(self._cell(inner, images) for inner in child.iterfind("w:tr/w:tc", NAMESPACES))
+            else:
+                pieces.extend(block.strip() for block, _ in self._blocks(child, images))
+        return "\n".join(piece for piece in pieces if piece)
+
+    def _blocks(self, element, images: Dict[str, str]) -> Iterator[Tuple[str, bool]]:
+        """Yield ``(markdown, is_list_item)`` for a block-level element."""
+        tag = element.tag
+        if tag == P:
+            text, is_list = self._paragraph(element, images)
+            if text:
+                yield text, is_list
+        elif tag == TBL:
+            table = self._table(element, images)
+            if table:
+                yield table, False
+        elif tag == SDT:
+            content = element.find(SDT_CONTENT)
+            if content is not None:
+                for child in content.iterchildren(P, TBL, SDT):
+                    yield from self._blocks(child, images)
+
+    def _story(self, root, rels: Dict[str, Tuple[str, str]]) -> List[Tuple[str, bool]]:
+        # Alternate content repeats drawings and text boxes for older readers
+        for fallback in list(root.iter(FALLBACK)):
+            fallback.getparent().remove(fallback)
+        images = {rel_id: target for rel_id, (rel_type, target) in rels.items() if rel_type == "image"}
+        blocks = []
+        for child in root.iterchildren(P, TBL, SDT):
+            blocks.extend(self._blocks(child, images))
+        return blocks
+
+    def _margins(self, kind: str) -> List[Tuple[str, bool]]:
+        """Blocks of the default headers (or footers) of all sections, each distinct block once."""
+        parts = []
+        for reference in self.body.iterfind(f".//w:sectPr/w:{kind}Reference", NAMESPACES):
+            rel = self.rels.get(reference.get(RID))
+            if reference.get(TYPE) == "default" and rel is not None and rel[1] not in parts:
+                parts.append(rel[1])
+        blocks = []
+        for part in parts:
+            try:
+                root = self._parse(part)
+            except KeyError:
+                continue
+            for block in self._story(root, self._rels(part)):
+                if block not in blocks:
+                    blocks.append(block)
+        return blocks
+
+    def read(self, save_image: SaveImage) -> str:
+        """The document as markdown; ``save_image`` is called for every image reached."""
+        self._save_image = save_image
+        self._counters.clear()
+        blocks = self._margins("header")
+        blocks.extend(self._story(self.body, self.rels))
+        blocks.extend(self._margins("footer"))
+
+        out = []
+        previous_list = False
+        for text, is_list in blocks:
+            if out:
+                out.append("\n" if is_list and previous_list else "\n\n")
+            out.append(text)
+            previous_list = is_list
+        return "".join(out)
@@ -0,0 +1,393 @@
+"""PDF/DOCX extraction routines.
+
+Everything in this module is synchronous and free of import-time side effects
+so it can run inside the extraction worker processes (see ``workers.py``)
+without pulling in the FastAPI app, the database or the Groq client.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import traceback
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+from pdf2image import convert_from_path
+
+import layout
+import local_format
+import metrics
+import ocr
+import placeholders
+import transcode
+from config import (
+    IMAGE_FORMAT,
+    IMAGE_MAX_DIMENSION,
+    IMAGE_QUALITY,
+    IMAGE_THUMBNAIL_SIZE,
+    LOCAL_FORMATTING,
+    OCR_DPI,
+    OCR_ENABLED,
+    OCR_LANG,
+    PDF_DETECT_COLUMNS,
+    PUBLIC_BASE_URL,
+)
+from docx_markdown import DocxReader
+from image_store import WriteBatch, get_image_writer
+from models import PLACEHOLDER_FORMAT, ImageData
+
+logger = logging.getLogger(__name__)
+
+# PDF text blocks are marked up as headings, lists and code from their fonts
+# (see ``local_format``) unless every chunk goes to the LLM, which then sees
+# the plain text as before
+MARKUP_PDF_BLOCKS = LOCAL_FORMATTING != "llm"
+
+# Everything besides the document itself that changes what it extracts to
+# (part of page fingerprints and result cache keys); bump the version when
+# extracted pages or documents change shape or content for the same input
+EXTRACTION_SETTINGS = (
+    f"extraction=2;markup={MARKUP_PDF_BLOCKS};columns={PDF_DETECT_COLUMNS};ocr={OCR_ENABLED}:{OCR_DPI}:{OCR_LANG};"
+    f"images={IMAGE_FORMAT}:{IMAGE_QUALITY}:{IMAGE_MAX_DIMENSION}:{IMAGE_THUMBNAIL_SIZE};"
+    f"base_url={PUBLIC_BASE_URL}\n"
+)
+
+
+class SavedImage(NamedTuple):
+    url: str
+    ext: str  # of the stored image (without dot), which may have been transcoded
+    thumbnail: Optional[str]
+
+
+def save_image_locally(image_bytes: bytes, filename: str, batch: WriteBatch) -> SavedImage:
+    """Save image to the content-addressed image store and return its URLs.
+    
+    Args:
+        image_bytes: The image data as bytes
+        filename: Original filename (used for extension)
+        batch: Write batch of the current extraction; the files exist once it has been waited for
+        
+    Returns:
+        SavedImage: URL and format of the (transcoded) image and its thumbnail URL;
+        identical images share one URL
+    """
+    try:
+        # Get file extension from original filename, default to .png
+        file_ext = os.path.splitext(filename)[1].lower() or '.png'
+        saved = SavedImage(*transcode.save_image(batch, image_bytes, file_ext))
+        metrics.IMAGES.inc()
+        return saved
+        
+    except Exception as e:
+        logger.error(f"Error saving image: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
+
+def extract_images_from_pdf(pdf_bytes: bytes, doc_name: str = "") -> List[ImageData]:
+    """Extract images from PDF and save them locally.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes
+        doc_name: Base name of the document (for naming images)
+        
+    Returns:
+        List of ImageData objects with image metadata
+    """
+    images = []
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
+            temp_pdf.write(pdf_bytes)
+            temp_pdf_path = temp_pdf.name
+
+        try:
+            images_list = convert_from_path(temp_pdf_path)
+            with get_image_writer().batch() as batch:
+                for i, image in enumerate(images_list):
+                    img_byte_arr = io.BytesIO()
+                    image.save(img_byte_arr, format='PNG')
+                    img_bytes = img_byte_arr.getvalue()
+                    
+                    # Page renders are stored by content like any other image
+                    saved = save_image_locally(img_bytes, f"{doc_name}_page_{i+1}.png", batch)
+                    
+                    images.append(ImageData(
+                        data=saved.url,
+                        type=f"image/{saved.ext}",
+                        description=f"Page {i+1}",
+                        thumbnail=saved.thumbnail
+                    ))
+        finally:
+            os.unlink(temp_pdf_path)
+    except Exception as e:
+        logger.error(f"Error extracting images from PDF: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
+    return images
+
+def extract_text_and_images_from_docx(docx_path: str, doc_name: str = "") -> tuple[str, List[ImageData], Dict[str, str]]:
+    """Extract markdown and images from DOCX while maintaining their positions and return placeholder map.
+
+    Headings, lists and tables are kept as markdown (see ``docx_markdown``).
+    """
+    images = []
+    placeholder_map = {}
+    # Saved images by part name, so an image repeated in the document is stored once
+    saved_parts: Dict[str, SavedImage] = {}
+    with metrics.timed("docx_open"):
+        reader = DocxReader(docx_path)
+    # Images are written in the background while the document is walked
+    with reader, get_image_writer().batch() as batch:
+        def save(name: str, ext: str) -> str:
+            saved = saved_parts.get(name)
+            if saved is None:
+                img_name = f"{doc_name}_img_{len(images)+1}{ext}"
+                saved = saved_parts[name] = save_image_locally(reader.read_part(name), img_name, batch)
+            placeholder = PLACEHOLDER_FORMAT.format(len(images))
+            images.append(ImageData(data=saved.url, type=f"image/{saved.ext}", description=f"Image {len(images)+1}", placeholder=placeholder, thumbnail=saved.thumbnail))
+            placeholder_map[placeholder] = saved.url
+            return placeholder
+
+        with metrics.timed("docx_walk"):
+            text = reader.read(save)
+    # Replace all placeholders with markdown image tags
+    text = placeholders.substitute(text, {img.placeholder: placeholders.image_markdown(img.data) for img in images})
+    return text, images, placeholder_map
+
+def pdf_page_count(pdf_path: str) -> int:
+    """Return the number of pages in the PDF at ``pdf_path``."""
+    doc = fitz.open(pdf_path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def plan_page_shards(page_count: int, max_shards: int, min_pages_per_shard: int) -> List[Tuple[int, int]]:
+    """Split pages ``1..page_count`` into contiguous, balanced ``(first, last)`` ranges.
+
+    Small documents stay in a single shard; larger ones get at most
+    ``max_shards`` shards of at least ``min_pages_per_shard`` pages each.
+    """
+    if page_count <= 0:
+        return []
+    shards = max(1, min(max_shards, page_count // max(1, min_pages_per_shard)))
+    size, extra = divmod(page_count, shards)
+    ranges = []
+    first = 1
+    for i in range(shards):
+        last = first + size - 1 + (1 if i < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+def page_fingerprint(doc, page, text_blocks: Optional[Iterable[Tuple[Sequence[float], str]]] = None) -> str:
+    """Hash what a page extracts from: its text blocks, its images and the extraction settings.
+
+    Pages with the same fingerprint extract to the same lines and images,
+    whichever document and page number they come from. Images are hashed by
+    their stream (xref numbers change whenever a PDF is written again) and
+    position. Pass the page's ``(bbox, text)`` blocks as ``text_blocks`` if
+    they have already been extracted.
+    """
+    digest = hashlib.sha256(EXTRACTION_SETTINGS.encode())
+    digest.update(repr(tuple(page.rect)).encode())
+    if text_blocks is None:
+        text_blocks = [(block[:4], block[4]) for block in page.get_text("blocks", flags=fitz.TEXTFLAGS_BLOCKS, sort=True) if block[6] == 0]
+    for (x0, y0, x1, y1), text in text_blocks:
+        digest.update(f"T{x0:.2f},{y0:.2f},{x1:.2f},{y1:.2f}\n{text.strip()}\0".encode())
+    for img in page.get_images(full=True):
+        try:
+            rects = page.get_image_rects(img[0])
+        except Exception:
+            rects = []
+        digest.update(f"I{tuple(rects[0]) if rects else None}\n".encode())
+        digest.update(doc.xref_stream_raw(img[0]) or b"")
+    return digest.hexdigest()
+
+def pdf_page_fingerprints(pdf_path: str, first_page: int, last_page: int) -> List[str]:
+    """Fingerprints of pages ``first_page..last_page`` (1-based, inclusive) of a PDF."""
+    doc = fitz.open(pdf_path)
+    try:
+        with metrics.timed("pdf_fingerprint"):
+            return [page_fingerprint(doc, doc[page_num - 1]) for page_num in range(first_page, last_page + 1)]
+    finally:
+        doc.close()
+
+def _extract_pdf_page(doc, page, page_num: int, batch: WriteBatch, ocr_blocks: Optional[List[ocr.OcrBlock]] = None) -> Dict[str, Any]:
+    """Extract one page into reading-order lines.
+
+    Returns a dict with ``lines`` (each line a list of ``("text", str)`` or
+    ``("image", local_index)`` tokens) and ``images`` (URL and extension of
+    each saved image in extraction order). Image indices are local to the page
+    so pages can be extracted independently and numbered when they are stitched.
+    ``needs_ocr`` is set for pages with images but no text layer; pass
+    ``ocr_blocks`` to lay out OCR'd text in place of the missing text blocks.
+    Pages whose OCR failed (``ocr_blocks`` None) keep ``needs_ocr`` set, so
+    they are not kept for reuse and OCR is tried again next time.
+    ``fingerprint`` is the page's ``page_fingerprint``.
+    Images are queued on ``batch``; their files exist once it is waited for.
+    """
+    # Get page dimensions for relative positioning
+    page_width = page.rect.width
+    page_height = page.rect.height
+    
+    # Get all text blocks with their positions and fonts
+    blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_BLOCKS, sort=True)["blocks"]  # sort=True helps with reading order
+    blocks = [block for block in blocks if block["type"] == 0]
+    fingerprint = page_fingerprint(doc, page, [(block["bbox"], local_format.block_text(block)) for block in blocks])
+    image_list = page.get_images(full=True)
+    
+    # Bounding boxes go to the layout engine, contents stay in a parallel list
+    boxes = []
+    contents = []
+    page_images = []
+    
+    # Process text blocks: headings, lists and code are marked up from their fonts
+    body_size = local_format.body_font_size(blocks) if MARKUP_PDF_BLOCKS else 0.0
+    for block in blocks:
+        text = local_format.block_markdown(block, body_size) if MARKUP_PDF_BLOCKS else local_format.block_text(block).strip()
+        if text:  # If block has text
+            boxes.append((*block["bbox"], True))
+            contents.append(('text', text))
+    has_text = bool(contents)
+    for x0, y0, x1, y1, text in ocr_blocks or ():
+        boxes.append((x0, y0, x1, y1, True))
+        contents.append(('text', text))
+    
+    # Process images
+    for img_idx, img in enumerate(image_list, 1):
+        xref = img[0]
+        try:
+            base_image = doc.extract_image(xref)
+            saved = save_image_locally(base_image["image"], f"page_{page_num}_img_{img_idx}.{base_image['ext']}", batch)
+            
+            # Get image position using get_image_rect if available, otherwise approximate
+            try:
+                bbox = page.get_image_rects(xref)
+                if bbox:
+                    bbox = bbox[0]  # Take first rectangle if multiple
+                    y0, y1, x0, x1 = bbox.y0, bbox.y1, bbox.x0, bbox.x1
+                else:
+                    # Fallback to page dimensions if can't get exact position
+                    y0, y1, x0, x1 = 0, page_height, 0, page_width
+            except Exception:
+                y0, y1, x0, x1 = 0, page_height, 0, page_width
+            
+            # Add image to content elements
+            boxes.append((x0, y0, x1, y1, False))
+            contents.append(('image', len(page_images)))
+            page_images.append({'url': saved.url, 'ext': saved.ext, 'thumbnail': saved.thumbnail})
+            
+        except Exception as e:
+            logger.warning(f"Error processing image {img_idx} on page {page_num}: {str(e)}")
+    
+    # Group elements into lines in reading order (columns are read one at a time)
+    lines = layout.page_reading_order(boxes, detect_columns=PDF_DETECT_COLUMNS)
+    
+    return {
+        'page': page_num,
+        'lines': [[contents[i] for i in line] for line in lines],
+        'images': page_images,
+        'needs_ocr': OCR_ENABLED and ocr_blocks is None and not has_text and bool(image_list),
+        'fingerprint': fingerprint,
+    }
+
+def ocr_pdf_page(pdf_path: str, page_num: int) -> Dict[str, Any]:
+    """Re-extract page ``page_num`` (1-based) with OCR'd text blocks, if OCR succeeds."""
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_num - 1]
+        ocr_blocks = ocr.ocr_page(doc, page, page_num)
+        with get_image_writer().batch() as batch, metrics.timed("pdf_page"):
+            result = _extract_pdf_page(doc, page, page_num, batch, ocr_blocks=ocr_blocks)
+        metrics.PAGES.inc("ocr")
+        return result
+    finally:
+        doc.close()
+
+def extract_pdf_pages(pdf_path: str, first_page: int, last_page: int) -> List[Dict[str, Any]]:
+    """Extract pages ``first_page..last_page`` (1-based, inclusive) of a PDF.
+
+    Each call reopens the document from ``pdf_path``, so several workers can
+    process disjoint page ranges of the same file in parallel.
+    """
+    return extract_pdf_page_numbers(pdf_path, range(first_page, last_page + 1))
+
+def extract_pdf_page_numbers(pdf_path: str, page_numbers: Sequence[int]) -> List[Dict[str, Any]]:
+    """Extract the given pages (1-based, in that order) of a PDF, like ``extract_pdf_pages``."""
+    with metrics.timed("pdf_open"):
+        doc = fitz.open(pdf_path)
+    try:
+        pages = []
+        # Images of all pages are written while the following pages are parsed;
+        # the shard is only returned once they are on disk
+        with get_image_writer().batch() as batch:
+            for page_num in page_numbers:
+                with metrics.timed("pdf_page"):
+                    pages.append(_extract_pdf_page(doc, doc[page_num - 1], page_num, batch))
+        metrics.PAGES.inc("native", amount=len(pages))
+        return pages
+    except Exception as e:
+        logger.error(f"Error in PDF processing (pages {page_numbers[0]}-{page_numbers[-1]}): {str(e)}")
+        raise
+    finally:
+        doc.close()
+
+def assemble_pdf_page(page: Dict[str, Any], images: List[ImageData], placeholder_map: Dict[str, str]) -> str:
+    """Number the images of one extracted page and build its text.
+
+    The page's images are appended to ``images`` and ``placeholder_map``,
+    which hold those of all preceding pages; the text uses placeholders.
+    """
+    # Give this page's images document-wide placeholders
+    page_placeholders = []
+    for page_image in page['images']:
+        global_img_idx = len(images)
+        placeholder = PLACEHOLDER_FORMAT.format(global_img_idx)
+        image_url = page_image['url']
+        images.append(ImageData(
+            data=image_url,
+            type=f"image/{page_image['ext']}",
+            description=f"Image {global_img_idx+1}",
+            placeholder=placeholder,
+            thumbnail=page_image['thumbnail']
+        ))
+        placeholder_map[placeholder] = image_url
+        page_placeholders.append(placeholder)
+    
+    # Build the page content
+    page_content = []
+    for line in page['lines']:
+        line_content = []
+        for kind, content in line:
+            if kind == 'text':
+                line_content.append(content)
+            else:  # image
+                line_content.append(page_placeholders[content])
+        page_content.append(" ".join(line_content).strip())
+    
+    return "\n\n".join(page_content).strip()
+
+def assemble_pdf_pages(pages: List[Dict[str, Any]]) -> tuple[str, List[ImageData], Dict[str, str]]:
+    """Number the images of extracted pages and stitch the page text.
+
+    ``pages`` must be in page order; the output is the same whether they were
+    extracted in one pass or in several shards.
+    """
+    images = []
+    placeholder_map = {}
+    text_parts = [assemble_pdf_page(page, images, placeholder_map) for page in pages]
+    
+    # Combine all pages with page breaks
+    full_text = "\n\n---\n\n".join(text_parts).strip()
+    
+    # Replace all placeholders with markdown image tags
+    full_text = placeholders.substitute(full_text, {img.placeholder: placeholders.image_markdown(img.data) for img in images})
+    
+    return full_text, images, placeholder_map
+
+def extract_text_and_images_from_pdf(pdf_path: str) -> tuple[str, List[ImageData], Dict[str, str]]:
+    """Extract a whole PDF in the current process (no sharding)."""
+    pages = extract_pdf_pages(pdf_path, 1, pdf_page_count(pdf_path))
+    pages = [ocr_pdf_page(pdf_path, page['page']) if page['needs_ocr'] else page for page in pages]
+    return assemble_pdf_pages(pages)
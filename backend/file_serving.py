@@ -0,0 +1,89 @@
+"""Serving extracted images from the upload directory.
+
+Image store files are named after the SHA-256 of their content (or of their
+source, for transcoded variants) and never change once written, so the name
+doubles as a strong ETag and browsers may keep them for a year without
+asking again. Other files in the directory (from before images were content
+addressed) get an ETag from their size and modification time and are
+revalidated on every use. Conditional requests are answered with 304.
+
+Bodies are streamed by Starlette's ``FileResponse``, which also handles
+``Range``/``If-Range`` and hands the file to the server for zero-copy sending
+when it supports the ASGI pathsend extension.
+"""
+import email.utils
+import mimetypes
+import os
+import stat
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from image_store import ImageStore
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Formats written by the image store that older mimetypes tables lack
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+def resolve(root: str, relative_path: str) -> Optional[str]:
+    """The absolute path of ``relative_path`` below ``root``, or None if it escapes ``root``."""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match uses weak comparison and takes precedence over If-Modified-Since
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def upload_response(request: Request, root: str, relative_path: str) -> Response:
+    """Respond with the file at ``relative_path`` below ``root``.
+
+    Raises:
+        HTTPException: 404 if there is no such file
+    """
+    path = resolve(root, relative_path)
+    try:
+        stat_result = os.stat(path) if path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    name = ImageStore.name_from_url(relative_path)
+    if name is not None:
+        etag = f'"{name.split(".", 1)[0]}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        cache_control = REVALIDATE_CACHE_CONTROL
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Last-Modified": email.utils.formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers["Accept-Ranges"] = "bytes"
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
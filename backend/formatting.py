@@ -0,0 +1,516 @@
+"""LLM-based Markdown formatting.
+
+Documents are split into chunks at page and heading boundaries, the chunks
+are formatted concurrently by the configured formatter backend (Groq, a
+local OpenAI-compatible or Ollama server, or a stub; see ``llm_backends``)
+and the results are reassembled in order. Large documents are therefore
+formatted piecewise instead of overflowing the model context, and
+wall-clock time follows the slowest chunk rather than the sum. Chunk sizes
+and completion limits are counted in tokens and fitted to the backend's
+context window, and a chunk whose output is cut off or drops content keeps
+its raw text without affecting the others (see ``token_budget``).
+
+Extraction already marks up the structure it can infer (see
+``local_format``); chunks whose markup it is confident about are kept as
+they are and never reach the LLM (``LOCAL_FORMATTING``). When a revised
+version of a document is converted, chunks whose text did not change reuse
+the output of the previous version (see ``lineage``).
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from config import (
+    LLM_BACKEND,
+    LLM_CHUNK_TOKENS,
+    LOCAL_FORMATTING,
+    LOCAL_FORMATTING_MIN_CONFIDENCE,
+)
+from lineage import Revision
+from llm_backends import BACKENDS, FormatterBackend
+from llm_cache import LlmCache
+import local_format
+import metrics
+from markdown_utils import beautify_markdown
+from models import ConversionProgress, ImageData
+import placeholders
+import token_budget
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+You are an expert technical documentation specialist and Markdown formatter. Your job is to transform raw extracted text into beautiful, production-ready Markdown for technical documentation, blog posts, or guides.
+
+**Formatting Rules:**
+- Use clear, hierarchical headings (#, ##, ###) for sections and subsections.
+- Use bullet ( - ) and numbered ( 1. ) lists for steps, features, or items.
+- Use **bold** and *italic* for emphasis where appropriate.
+- Use blockquotes ( > ) for notes, warnings, or tips.
+- Use code blocks (triple backticks) for commands, code, or configuration.
+- Add horizontal rules (---) to separate major sections.
+- Add spacing for readability.
+- If you see lines like 'Purpose:', 'Steps:', 'NOTE:', etc., convert them to appropriate Markdown (e.g., headings, blockquotes).
+- Beautify the output for clarity and easy reading.
+
+**Example Input:**
+Purpose:
+This tool converts PDF to Markdown.
+
+Steps:
+1. Upload your file
+2. Wait for conversion
+3. Download the Markdown
+
+NOTE: Images are preserved.
+
+**Example Output:**
+# Purpose
+
+This tool converts PDF to Markdown.
+
+---
+
+## Steps
+
+1. Upload your file
+2. Wait for conversion
+3. Download the Markdown
+
+> **Note:** Images are preserved.
+
+---
+
+- Always preserve the order and content of the original text.
+- Do NOT move or modify any image markdown or placeholders (e.g., ![](url) or __IMG_PLACEHOLDER_X__).
+"""
+
+USER_PROMPT_TEMPLATE = """Format the following document as beautiful, professional Markdown. Apply all formatting rules above. Do not move or modify any image markdown or placeholders.
+
+Document content:
+{content}"""
+
+LOCAL_FORMATTING_MODES = ("auto", "llm", "local")
+if LOCAL_FORMATTING not in LOCAL_FORMATTING_MODES:
+    logger.warning(f"Unknown LOCAL_FORMATTING {LOCAL_FORMATTING!r}, using 'auto'")
+    LOCAL_FORMATTING = "auto"
+
+if LLM_BACKEND not in BACKENDS:
+    logger.warning(f"Unknown LLM_BACKEND {LLM_BACKEND!r}, using 'groq'")
+    LLM_BACKEND = "groq"
+
+# Sampling parameters of every formatting request
+SAMPLING = {"temperature": 0.1, "top_p": 0.9, "frequency_penalty": 0.1, "presence_penalty": 0.1}
+
+_PROMPT_PREFIX, _PROMPT_SUFFIX = USER_PROMPT_TEMPLATE.split("{content}")
+
+# Separator the PDF extractor puts between pages
+PAGE_BREAK = "---"
+
+# Runs of blank lines and trailing whitespace, which do not change the formatting
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+# Paragraphs that look like the start of a new section
+_HEADING_RE = re.compile(r'^(#{1,6}\s+\S|[A-Z][\w /&(),-]{0,60}:\s*$|[A-Z0-9][A-Z0-9 /&(),-]{2,60}$)')
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_break_before: bool = False
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of ``text`` (see ``token_budget``)."""
+    return token_budget.count_tokens(text)
+
+
+@functools.lru_cache(maxsize=None)
+def _prompt_tokens() -> int:
+    # Tokens of a request besides the chunk content
+    return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(USER_PROMPT_TEMPLATE.format(content=""))
+
+
+def _pack(units: List[str], joiner: str, max_tokens: int) -> List[str]:
+    """Greedily join ``units`` into pieces of at most ``max_tokens`` each."""
+    pieces, current, size = [], [], 0
+    for unit, n in zip(units, token_budget.count_tokens_many(units)):
+        if current and size + n > max_tokens:
+            pieces.append(joiner.join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += n
+    if current:
+        pieces.append(joiner.join(current))
+    return pieces
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    """Split a paragraph larger than the budget at line, then word boundaries.
+
+    Splitting only ever happens at whitespace, so image markdown and
+    ``__IMG_PLACEHOLDER_X__`` markers are never cut in half.
+    """
+    lines = []
+    for line in block.split('\n'):
+        if estimate_tokens(line) > max_tokens:
+            lines.extend(_pack(line.split(' '), ' ', max_tokens))
+        else:
+            lines.append(line)
+    return _pack(lines, '\n', max_tokens)
+
+
+def split_into_chunks(text: str, max_tokens: int = LLM_CHUNK_TOKENS) -> List[Chunk]:
+    """Split document text into chunks of roughly ``max_tokens`` each.
+
+    Chunks end at paragraph boundaries. Once a chunk is at least half full it
+    is closed early at the next page break or heading-like paragraph, so
+    sections are formatted together. Page breaks that end a chunk are not sent
+    to the model; ``join_chunks`` puts them back between the results.
+    """
+    chunks: List[Chunk] = []
+    current: List[str] = []
+    size = 0
+    page_break_before = False
+
+    def flush():
+        nonlocal current, size, page_break_before
+        if current:
+            chunks.append(Chunk("\n\n".join(current), page_break_before))
+            page_break_before = False
+        current, size = [], 0
+
+    blocks = text.split("\n\n")
+    for block, n in zip(blocks, token_budget.count_tokens_many(blocks)):
+        if block.strip() == PAGE_BREAK and size >= max_tokens // 2:
+            flush()
+            page_break_before = True
+            continue
+        if n > max_tokens:
+            flush()
+            for piece in _split_oversized(block, max_tokens):
+                chunks.append(Chunk(piece, page_break_before))
+                page_break_before = False
+            continue
+        if current and (size + n > max_tokens or (size >= max_tokens // 2 and _HEADING_RE.match(block.lstrip()))):
+            flush()
+        current.append(block)
+        size += n
+    flush()
+    return chunks
+
+
+def join_chunks(chunks: List[Chunk], outputs: List[Optional[str]]) -> str:
+    """Reassemble formatted chunks in order; failed chunks keep their raw text."""
+    parts = []
+    for i, (chunk, output) in enumerate(zip(chunks, outputs)):
+        if i:
+            parts.append("\n\n---\n\n" if chunk.page_break_before else "\n\n")
+        parts.append(chunk.text if output is None else output.strip())
+    return "".join(parts)
+
+
+def prompt_content(user_prompt: str) -> str:
+    """The document content of a formatting prompt, as a perfect formatter would return it."""
+    if user_prompt.startswith(_PROMPT_PREFIX):
+        user_prompt = user_prompt[len(_PROMPT_PREFIX):]
+    if _PROMPT_SUFFIX and user_prompt.endswith(_PROMPT_SUFFIX):
+        user_prompt = user_prompt[:-len(_PROMPT_SUFFIX)]
+    return user_prompt
+
+
+_backends: Dict[str, FormatterBackend] = {}
+
+
+def get_backend(name: str = LLM_BACKEND) -> FormatterBackend:
+    """Return the shared formatter backend called ``name`` (see ``llm_backends``)."""
+    if name not in BACKENDS:
+        logger.warning(f"Unknown LLM backend {name!r}, using {LLM_BACKEND!r}")
+        name = LLM_BACKEND
+    if name not in _backends:
+        _backends[name] = BACKENDS[name](prompt_content)
+    return _backends[name]
+
+
+async def close_backends() -> None:
+    for backend in _backends.values():
+        await backend.aclose()
+
+
+def llm_fingerprint(backend: FormatterBackend) -> str:
+    """Identifies everything that changes what ``backend`` returns for a chunk."""
+    return hashlib.sha256(
+        "\0".join([SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, backend.fingerprint, json.dumps(SAMPLING, sort_keys=True)]).encode()
+    ).hexdigest()
+
+
+def prompt_fingerprint(backend: FormatterBackend) -> str:
+    """Identifies everything about the formatter that changes its output."""
+    return hashlib.sha256(
+        "\0".join([
+            llm_fingerprint(backend),
+            f"local={LOCAL_FORMATTING}:{LOCAL_FORMATTING_MIN_CONFIDENCE}",
+            f"chunks={LLM_CHUNK_TOKENS}:context={backend.context_tokens}",
+            token_budget.settings_fingerprint(),
+        ]).encode()
+    ).hexdigest()
+
+
+async def _format_chunk(content: str, backend: FormatterBackend) -> str:
+    """Format one chunk; raises if the output is cut off or drops content."""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(content=content)}
+    ]
+    content_tokens = estimate_tokens(content)
+    prompt_tokens = _prompt_tokens() + content_tokens
+    # Ask for about as much as the chunk is expected to need, not a fixed cap
+    limit = token_budget.completion_limit(prompt_tokens, backend.context_tokens)
+    max_tokens = token_budget.completion_budget(content_tokens, prompt_tokens, backend.context_tokens)
+
+    if max_tokens < 100:  # If not enough tokens left for a reasonable response
+        raise ValueError("Chunk is too large to process with the current model's context window")
+
+    completion = await backend.complete(messages, max_tokens, SAMPLING)
+    if completion.finish_reason == "length" and max_tokens < limit:
+        # Longer than predicted: once more with as much as a completion may have
+        logger.info(f"Output cut off at {max_tokens} tokens, retrying with {limit}")
+        completion = await backend.complete(messages, limit, SAMPLING)
+    if completion.finish_reason == "length":
+        raise ValueError("LLM output was cut off at the token limit")
+    if not token_budget.content_preserved(content, completion.text):
+        raise ValueError("LLM output dropped content of the chunk")
+    return completion.text
+
+
+def chunk_key(text: str, fingerprint: str) -> Tuple[str, Dict[str, str]]:
+    """Key of the LLM output for a chunk, wherever it is in whichever document.
+
+    The text is normalized (Unicode NFC, line endings, trailing whitespace,
+    blank lines) and keyed together with the ``llm_fingerprint`` of the
+    backend that formats it. Returns the key
+    and a map from the chunk's image placeholders to ones numbered from 0 in
+    chunk order; outputs are stored with those.
+    """
+    local: Dict[str, str] = {}
+
+    def renumber(match: re.Match) -> str:
+        return local.setdefault(match.group(0), placeholders.LLM_PLACEHOLDER_FORMAT.format(len(local)))
+
+    normalized = unicodedata.normalize("NFC", text.replace("\r\n", "\n"))
+    normalized = _BLANK_LINES_RE.sub("\n\n", _TRAILING_SPACE_RE.sub("", normalized)).strip()
+    normalized = placeholders.LLM_PLACEHOLDER_RE.sub(renumber, normalized)
+    return hashlib.sha256(f"{fingerprint}\0{normalized}".encode()).hexdigest(), local
+
+
+async def _cached_format_chunk(key: str, content: str, local: Dict[str, str], backend: FormatterBackend, cache: LlmCache) -> str:
+    # Returns the output with the chunk-local placeholders of ``local``
+    output = await asyncio.to_thread(cache.get, key)
+    metrics.CACHE_REQUESTS.inc("llm", "miss" if output is None else "hit")
+    if output is None:
+        output = placeholders.substitute(await _format_chunk(content, backend), local, placeholders.LLM_PLACEHOLDER_RE)
+        await asyncio.to_thread(cache.put, key, output)
+    return output
+
+
+def _format_locally(chunk: Chunk) -> bool:
+    if LOCAL_FORMATTING == "local":
+        return True
+    if LOCAL_FORMATTING == "llm":
+        return False
+    return local_format.chunk_confidence(chunk.text) >= LOCAL_FORMATTING_MIN_CONFIDENCE
+
+
+async def format_chunks(
+    chunks: List[Chunk],
+    progress: Optional[ConversionProgress] = None,
+    on_result: Optional[Callable[[int, Optional[str]], None]] = None,
+    cache: Optional[LlmCache] = None,
+    backend: Optional[FormatterBackend] = None,
+) -> List[Optional[str]]:
+    """Format all chunks concurrently; a chunk that fails yields ``None``.
+
+    Chunks go to ``backend`` (``LLM_BACKEND`` by default).
+    ``on_result`` is called with each chunk's index and output as soon as it arrives.
+    With a ``cache``, chunks it has an output for are not sent to the model
+    and identical chunks are sent once.
+    """
+    if backend is None:
+        backend = get_backend()
+    fingerprint = llm_fingerprint(backend)
+    # chunk key -> lookup (or request) shared by the chunks with that key
+    pending: Dict[str, asyncio.Task] = {}
+
+    async def format_one(i: int, chunk: Chunk) -> str:
+        output = None
+        try:
+            if cache is None:
+                output = await _format_chunk(chunk.text, backend)
+            else:
+                key, local = chunk_key(chunk.text, fingerprint)
+                if key not in pending:
+                    pending[key] = asyncio.ensure_future(_cached_format_chunk(key, chunk.text, local, backend, cache))
+                output = placeholders.substitute(
+                    await pending[key], {v: k for k, v in local.items()}, placeholders.LLM_PLACEHOLDER_RE,
+                )
+            return output
+        finally:
+            if progress is not None:
+                progress.chunks_formatted += 1
+            if on_result is not None:
+                on_result(i, output)
+
+    if progress is not None:
+        progress.chunks_total += len(chunks)
+    results = await asyncio.gather(*(format_one(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+    outputs = []
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.error(f"Error processing chunk {i + 1}/{len(chunks)} with {backend.name}: {str(result)}")
+            outputs.append(None)
+        else:
+            outputs.append(result)
+    return outputs
+
+
+def _fallback_markdown(text: str, images: List[ImageData], filename: str) -> str:
+    """Unformatted document used when the LLM output cannot be used."""
+    fallback = f"# {os.path.splitext(filename)[0]}\n\n{text}"
+    if not images:
+        return fallback
+    fallback = placeholders.substitute(fallback, {img.placeholder: f"{placeholders.image_markdown(img.data)}\n" for img in images})
+    with metrics.timed("beautify"):
+        return beautify_markdown(fallback)
+
+
+async def format_document(
+    text: str,
+    images: List[ImageData],
+    filename: str,
+    progress: Optional[ConversionProgress] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    revision: Optional[Revision] = None,
+    llm_cache: Optional[LlmCache] = None,
+    backend: Optional[FormatterBackend] = None,
+) -> Tuple[str, bool]:
+    """Format a document and report whether every chunk went through the LLM.
+
+    Returns the markdown and ``True`` when it is fully formatted, ``False``
+    when some or all of it is the unformatted fallback (so callers can avoid
+    caching a degraded result).
+
+    ``on_chunk`` receives a preview of the markdown piece by piece, in order,
+    as chunks come back from the model: the chunk output with its images
+    restored, prefixed by the separator ``join_chunks`` would put before it.
+    The returned markdown is the authoritative (post-processed) result.
+
+    Chunks the previous version of the document in ``revision``'s lineage
+    already had are not sent again; the LLM outputs are recorded on it.
+    Chunks found in ``llm_cache`` are not sent either; the others go to
+    ``backend`` (``LLM_BACKEND`` by default).
+    """
+    if not text.strip() and not images:
+        return "# Document Conversion\n\nNo text content could be extracted from the document.", True
+
+    if backend is None:
+        backend = get_backend()
+    fingerprint = llm_fingerprint(backend)
+    # Replace image placeholders with temporary markers that won't be modified by the LLM
+    safe_placeholders = {}
+    placeholder_map = {}
+    for i, img in enumerate(images):
+        safe_placeholder = placeholders.LLM_PLACEHOLDER_FORMAT.format(i)
+        safe_placeholders[img.placeholder] = safe_placeholder
+        placeholder_map[safe_placeholder] = f"{placeholders.image_markdown(img.data)}\n"
+    processed_text = placeholders.substitute(text, safe_placeholders)
+
+    chunks = split_into_chunks(
+        processed_text, token_budget.chunk_token_budget(backend.context_tokens, _prompt_tokens(), LLM_CHUNK_TOKENS),
+    )
+    if len(chunks) > 1:
+        logger.info(f"Formatting {filename} in {len(chunks)} chunks")
+    finished: Dict[int, Optional[str]] = {}
+    next_chunk = 0
+
+    def chunk_done(i: int, output: Optional[str]):
+        nonlocal next_chunk
+        finished[i] = output
+        # Pieces are handed out in order; a finished chunk waits for earlier ones
+        while next_chunk in finished:
+            chunk = chunks[next_chunk]
+            output = finished.pop(next_chunk)
+            piece = chunk.text if output is None else output.strip()
+            if next_chunk:
+                piece = ("\n\n---\n\n" if chunk.page_break_before else "\n\n") + piece
+            on_chunk(placeholders.substitute(piece, placeholder_map, placeholders.LLM_PLACEHOLDER_RE))
+            next_chunk += 1
+
+    # Chunks the local formatter is confident about are used as they are,
+    # unchanged ones of a revised document as the LLM formatted them before
+    outputs: List[Optional[str]] = [None] * len(chunks)
+    remote = []
+    keys: Dict[int, Tuple[str, Dict[str, str]]] = {}
+    local_count = 0
+    for i, chunk in enumerate(chunks):
+        if _format_locally(chunk):
+            outputs[i] = chunk.text
+            local_count += 1
+            continue
+        if revision is not None:
+            key, local = keys[i] = chunk_key(chunk.text, fingerprint)
+            output = revision.chunk(key)
+            if output is not None:
+                revision.add_chunk(key, output)
+                outputs[i] = placeholders.substitute(output, {v: k for k, v in local.items()}, placeholders.LLM_PLACEHOLDER_RE)
+                continue
+        remote.append(i)
+    metrics.CHUNKS.inc("local", amount=local_count)
+    metrics.CHUNKS.inc("reused", amount=len(chunks) - local_count - len(remote))
+    metrics.CHUNKS.inc("llm", amount=len(remote))
+    if progress is not None:
+        progress.chunks_total = progress.chunks_formatted = len(chunks) - len(remote)
+    if on_chunk is not None:
+        for i, output in enumerate(outputs):
+            if output is not None:
+                chunk_done(i, output)
+    if remote:
+        if len(remote) < len(chunks):
+            logger.info(f"Formatting {len(remote)} of {len(chunks)} chunks of {filename} with the LLM")
+        remote_outputs = await format_chunks(
+            [chunks[i] for i in remote], progress,
+            on_result=(lambda j, output: chunk_done(remote[j], output)) if on_chunk is not None else None,
+            cache=llm_cache, backend=backend,
+        )
+        for i, output in zip(remote, remote_outputs):
+            outputs[i] = output
+            if revision is not None and output is not None:
+                key, local = keys[i]
+                revision.add_chunk(key, placeholders.substitute(output, local, placeholders.LLM_PLACEHOLDER_RE))
+    if all(output is None for output in outputs):
+        return _fallback_markdown(text, images, filename), False
+    markdown_output = join_chunks(chunks, outputs)
+
+    if images:
+        # Restore the original image markdown
+        markdown_output = placeholders.substitute(markdown_output, placeholder_map, placeholders.LLM_PLACEHOLDER_RE)
+        # Clean up any remaining formatting issues
+        markdown_output = markdown_output.replace('---\n', '\n')
+        markdown_output = re.sub(r'\n{3,}', '\n\n', markdown_output)
+    with metrics.timed("beautify"):
+        markdown_output = beautify_markdown(markdown_output)
+    return markdown_output, None not in outputs
+
+
+async def process_document_with_groq(text: str, images: List[ImageData], filename: str) -> str:
+    """Process document text with Groq API and return formatted Markdown.
+
+    This function preserves the exact position of images by using placeholders
+    that are replaced after the markdown processing is complete.
+    """
+    markdown, _ = await format_document(text, images, filename)
+    return markdown
@@ -0,0 +1,313 @@
+"""Content-addressed store for extracted images.
+
+Images are written once per distinct content to
+``UPLOAD_DIR/<aa>/<bb>/<sha256><ext>``, so logos and headers repeated across
+pages and documents cost a single file, URLs are stable, and two uploads can
+never overwrite each other's images. A small SQLite index keeps a reference
+count per image: the result cache and the lineage index retain the images of
+the entries they hold and release them when an entry is replaced, expires or
+is evicted. Images nothing references any more (or ever did, e.g. from a
+failed conversion) are removed by ``collect_garbage`` once they have not been
+seen for a grace period; returning an image from a conversion counts as
+seeing it.
+
+Extraction hands images to an ``ImageWriter``: the URL is known as soon as
+the content is hashed, so files are written by a small thread pool while
+extraction carries on, and the index is updated once per ``WriteBatch``
+instead of once per image.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import metrics
+from config import IMAGE_INDEX_PATH, IMAGE_WRITE_QUEUE, IMAGE_WRITE_THREADS, PUBLIC_BASE_URL, UPLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStore:
+    def __init__(self, root: str, index_path: str, base_url: str):
+        self.root = root
+        self.index_path = index_path
+        self.base_url = base_url
+        self._local = threading.local()
+        # Shard directories known to exist, so makedirs runs once per directory
+        self._directories = set()
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        conn = self._index()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_seen REAL NOT NULL
+        )
+        """)
+        conn.commit()
+
+    def _index(self) -> sqlite3.Connection:
+        # Extraction workers and the app's threads share the index file, one
+        # connection per thread keeps sqlite3 happy
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _relative_path(name: str) -> str:
+        return f"{name[:2]}/{name[2:4]}/{name}"
+
+    def url_for(self, name: str) -> str:
+        return f"{self.base_url}/uploads/{self._relative_path(name)}"
+
+    @staticmethod
+    def name_for(data: bytes, ext: str, variant: bytes = b"") -> str:
+        """The store name of ``data``: its SHA-256 plus the normalized extension.
+
+        Images derived from ``data`` (e.g. transcoded) pass a ``variant``
+        describing the derivation, so they are named after their source.
+        """
+        ext = ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+        digest = hashlib.sha256(variant)
+        digest.update(data)
+        return f"{digest.hexdigest()}{ext}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, self._relative_path(name))
+
+    def write(self, name: str, data: bytes) -> None:
+        """Write the file for ``name`` unless it already exists (no index update)."""
+        path = self._path(name)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        # Write to a temp file and rename so readers never see a partial image
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                temp.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def ensure(self, name: str, produce: Callable[[], bytes]) -> int:
+        """Write ``produce()`` as ``name`` unless it exists; returns the file size."""
+        if self.exists(name):
+            return os.path.getsize(self._path(name))
+        data = produce()
+        with metrics.timed("image_save"):
+            self.write(name, data)
+        return len(data)
+
+    def record(self, sizes: Dict[str, int]) -> None:
+        """Add images (name -> size in bytes) to the index in one transaction."""
+        if not sizes:
+            return
+        now = time.time()
+        conn = self._index()
+        conn.executemany(
+            "INSERT INTO images (name, size, refcount, created_at, last_seen) VALUES (?, ?, 0, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET last_seen = excluded.last_seen",
+            [(name, size, now, now) for name, size in sizes.items()],
+        )
+        conn.commit()
+
+    def put(self, data: bytes, ext: str) -> str:
+        """Store ``data`` (if not already present) and return its URL."""
+        name = self.name_for(data, ext)
+        self.write(name, data)
+        self.record({name: len(data)})
+        return self.url_for(name)
+
+    @staticmethod
+    def name_from_url(url: str) -> Optional[str]:
+        """Return the store name of an image URL, or None for other URLs."""
+        name = url.rsplit("/", 1)[-1]
+        digest = name.split(".", 1)[0]
+        if len(digest) != 64 or not url.endswith(ImageStore._relative_path(name)):
+            return None
+        return name
+
+    def _adjust(self, urls: Iterable[str], delta: int) -> None:
+        names = Counter(name for name in map(self.name_from_url, urls) if name)
+        if not names:
+            return
+        now = time.time()
+        conn = self._index()
+        conn.executemany(
+            "UPDATE images SET refcount = MAX(refcount + ?, 0), last_seen = ? WHERE name = ?",
+            [(delta * count, now, name) for name, count in names.items()],
+        )
+        conn.commit()
+
+    def retain(self, urls: Iterable[str]) -> None:
+        """Add a reference to the images at ``urls`` (one per occurrence)."""
+        self._adjust(urls, 1)
+
+    def release(self, urls: Iterable[str]) -> None:
+        """Drop references taken by ``retain`` with the same ``urls``."""
+        self._adjust(urls, -1)
+
+    def touch(self, urls: Iterable[str]) -> None:
+        """Restart the grace period of the images at ``urls``."""
+        self._adjust(urls, 0)
+
+    def collect_garbage(self, grace_seconds: float) -> int:
+        """Delete unreferenced images not seen for ``grace_seconds``; returns the count."""
+        conn = self._index()
+        cutoff = time.time() - grace_seconds
+        rows = conn.execute("SELECT name FROM images WHERE refcount = 0 AND last_seen < ?", (cutoff,)).fetchall()
+        removed = 0
+        for (name,) in rows:
+            # The row goes first, and only if nothing retained or saw the image meanwhile
+            deleted = conn.execute(
+                "DELETE FROM images WHERE name = ? AND refcount = 0 AND last_seen < ?", (name, cutoff),
+            ).rowcount
+            conn.commit()
+            if not deleted:
+                continue
+            removed += 1
+            try:
+                os.unlink(self._path(name))
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Removed {removed} unreferenced images")
+        return removed
+
+
+class WriteBatch:
+    """Images queued by one extraction; see ``ImageWriter.batch``."""
+
+    def __init__(self, writer: "ImageWriter"):
+        self.writer = writer
+        self._writes: Dict[str, Future] = {}
+
+    def submit(self, data: bytes, ext: str) -> str:
+        """Queue ``data`` for writing and return its URL right away.
+
+        Blocks while the writer already holds ``max_pending`` images.
+        """
+        return self.submit_derived(self.writer.store.name_for(data, ext), lambda: data)
+
+    def submit_derived(self, name: str, produce: Callable[[], bytes]) -> str:
+        """Queue ``produce()`` to be written as ``name`` and return its URL.
+
+        ``produce`` runs on a writer thread, and only if the store does not
+        have ``name`` yet.
+        """
+        if name not in self._writes:
+            self._writes[name] = self.writer._submit(name, produce)
+        return self.writer.store.url_for(name)
+
+    def wait(self) -> List[BaseException]:
+        """Wait for every queued write, index the written images and return the errors."""
+        errors = []
+        sizes = {}
+        for name, future in self._writes.items():
+            error = future.exception()
+            if error is None:
+                sizes[name] = future.result()
+            else:
+                errors.append(error)
+        self._writes = {}
+        self.writer.store.record(sizes)
+        return errors
+
+    def __enter__(self) -> "WriteBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with metrics.timed("image_flush"):
+            errors = self.wait()
+        for error in errors:
+            logger.error(f"Error saving image: {str(error)}")
+        if errors and exc is None:
+            raise errors[0]
+
+
+class ImageWriter:
+    """Writes images to an ``ImageStore`` from a bounded thread pool.
+
+    At most ``max_pending`` images are queued or being written at a time;
+    beyond that ``WriteBatch.submit`` waits, so a document full of images
+    cannot pile its whole content up in memory.
+    """
+
+    def __init__(self, store: ImageStore, threads: int = IMAGE_WRITE_THREADS, max_pending: int = IMAGE_WRITE_QUEUE):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="image-writer")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+
+    def _write(self, name: str, produce: Callable[[], bytes]) -> int:
+        try:
+            return self.store.ensure(name, produce)
+        finally:
+            self._slots.release()
+
+    def _submit(self, name: str, produce: Callable[[], bytes]) -> Future:
+        self._slots.acquire()
+        try:
+            return self._executor.submit(self._write, name, produce)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def batch(self) -> WriteBatch:
+        """Start a batch of writes.
+
+        Used as a context manager, leaving the block waits for all of the
+        batch's writes, indexes the images and raises the first write error
+        (write errors are only logged if the block itself raised).
+        """
+        return WriteBatch(self)
+
+
+_store: Optional[ImageStore] = None
+_writer: Optional[ImageWriter] = None
+
+
+def get_image_store() -> ImageStore:
+    """Return this process's image store (created on first use)."""
+    global _store
+    if _store is None:
+        _store = ImageStore(UPLOAD_DIR, IMAGE_INDEX_PATH, PUBLIC_BASE_URL)
+    return _store
+
+
+def get_image_writer() -> ImageWriter:
+    """Return this process's image writer (created on first use)."""
+    global _writer
+    if _writer is None:
+        _writer = ImageWriter(get_image_store())
+    return _writer
+
+
+def _forget_after_fork():
+    # A forked worker inherits the writer without its threads and the store
+    # with the parent's SQLite connection; it has to create its own
+    global _store, _writer
+    _store = None
+    _writer = None
+
+
+os.register_at_fork(after_in_child=_forget_after_fork)
@@ -0,0 +1,182 @@
+"""Background conversion jobs.
+
+``POST /api/jobs`` hands the spooled upload to ``JobManager``, which runs the
+normal conversion pipeline on a bounded number of local workers and keeps
+per-stage progress and the final result for polling through
+``GET /api/jobs/{id}`` by the user who submitted it. Identical uploads from the same user are
+deduplicated onto one job, and each user is limited in how many jobs they
+may have active and submit per minute.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Union
+
+from models import ConversionProgress, ConversionResponse, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class JobLimitExceeded(Exception):
+    """Raised when a user has too many active jobs or submits too quickly."""
+
+
+class Job:
+    def __init__(self, user_email: str, user_id: Optional[int], filename: str, file_path: str, content_hash: str):
+        self.id = uuid.uuid4().hex
+        self.user_email = user_email
+        self.user_id = user_id
+        self.filename = filename
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.status = "queued"
+        self.progress = ConversionProgress()
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.result: Optional[ConversionResponse] = None
+
+    def owned_by(self, user_email: str, user_id: Optional[int]) -> bool:
+        """Whether the requester identified as ``user_email``/``user_id`` submitted this job.
+
+        Jobs submitted with a verified token belong to its user id; others
+        to the email they were submitted under.
+        """
+        if self.user_id is not None:
+            return user_id == self.user_id
+        return user_email == self.user_email
+
+    @property
+    def owner(self) -> Union[int, str]:
+        return _owner(self.user_email, self.user_id)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_status(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.id,
+            status=self.status,
+            filename=self.filename,
+            progress=self.progress,
+            created_at=self.created_at,
+            updated_at=self.finished_at or datetime.now(timezone.utc),
+            error=self.error,
+            result=self.result,
+        )
+
+
+def _owner(user_email: str, user_id: Optional[int]) -> Union[int, str]:
+    """The identity jobs are owned under: the verified user id, else the email."""
+    return user_id if user_id is not None else user_email
+
+
+JobRunner = Callable[[Job], Awaitable[ConversionResponse]]
+
+
+class JobManager:
+    def __init__(
+        self,
+        runner: JobRunner,
+        max_concurrent: int,
+        max_active_per_user: int,
+        max_submissions_per_minute: int,
+        result_ttl: float,
+    ):
+        self.runner = runner
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_active_per_user = max_active_per_user
+        self.max_submissions_per_minute = max_submissions_per_minute
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._by_content: Dict[Tuple[Union[int, str], str], str] = {}
+        self._submissions: Dict[str, Deque[float]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def find_duplicate(self, user_email: str, user_id: Optional[int], content_hash: str) -> Optional[Job]:
+        """Return a queued, running or completed job of the same user for the same content."""
+        self._prune()
+        job = self._jobs.get(self._by_content.get((_owner(user_email, user_id), content_hash), ""))
+        if job is not None and job.status != "failed":
+            return job
+        return None
+
+    def submit(self, user_email: str, user_id: Optional[int], filename: str, file_path: str, content_hash: str) -> Job:
+        """Queue a conversion of the spooled file at ``file_path``.
+
+        The job takes ownership of ``file_path`` and deletes it when done.
+
+        Raises:
+            JobLimitExceeded: if the user is over their active or per-minute limit
+        """
+        self._prune()
+        active = sum(1 for job in self._jobs.values() if job.user_email == user_email and job.active)
+        if active >= self.max_active_per_user:
+            raise JobLimitExceeded(f"You already have {active} conversions in progress")
+        now = time.monotonic()
+        recent = self._submissions.setdefault(user_email, deque())
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        if len(recent) >= self.max_submissions_per_minute:
+            raise JobLimitExceeded("Too many conversions submitted, please wait a minute")
+        recent.append(now)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = Job(user_email, user_id, filename, file_path, content_hash)
+        self._jobs[job.id] = job
+        self._by_content[(job.owner, content_hash)] = job.id
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        logger.info(f"Queued conversion job {job.id} for {user_email}: {filename}")
+        return job
+
+    async def _run(self, job: Job):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.result = await self.runner(job)
+                job.status = "completed"
+                job.progress.stage = "completed"
+        except Exception as e:
+            logger.error(f"Conversion job {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.progress.stage = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            self._tasks.pop(job.id, None)
+            try:
+                os.unlink(job.file_path)
+            except OSError:
+                pass
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL, and submission times older than a minute."""
+        now = datetime.now(timezone.utc)
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished_at is not None and (now - job.finished_at).total_seconds() > self.result_ttl
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_content.get((job.owner, job.content_hash)) == job.id:
+                del self._by_content[(job.owner, job.content_hash)]
+        cutoff = time.monotonic() - 60
+        for user_email in [email for email, recent in self._submissions.items() if not recent or recent[-1] < cutoff]:
+            del self._submissions[user_email]
+
+    async def shutdown(self):
+        """Cancel jobs that are still queued or running."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -0,0 +1,168 @@
+"""Incremental re-conversion of revised documents.
+
+Users upload new versions of the same document over and over (a manual
+with a few pages edited). A *lineage* is the series of uploads of one
+document by one user; for the latest conversion of each lineage the index
+keeps
+
+- every PDF page as extracted (see ``extraction.extract_pdf_pages``), by its
+  ``extraction.page_fingerprint``
+- the LLM output of every chunk, by ``formatting.chunk_key``
+
+so the next version re-extracts only the pages whose fingerprint is new and
+sends only the chunks whose text changed to the LLM. Pages are matched by
+content, not position, so inserted or removed pages do not invalidate the
+ones after them. The image URLs of stored pages stay valid because, given
+an image store, every lineage holds a reference to the images of its pages
+until it is replaced or evicted.
+
+Entries are stored in a local SQLite database and evicted like those of the
+result cache: after a TTL, then least recently updated first when the number
+of lineages or their total size exceeds its limit.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+
+def lineage_key(user_email: str, filename: str) -> str:
+    """Identify the lineage of an upload: the same file name uploaded by the same user."""
+    return hashlib.sha256(f"{user_email}\0{filename.strip().lower()}".encode()).hexdigest()
+
+
+class Revision:
+    """One conversion in a lineage: what it may reuse and what it leaves for the next one."""
+
+    def __init__(self, pages: Optional[Dict[str, Dict[str, Any]]] = None, chunks: Optional[Dict[str, str]] = None):
+        self._previous_pages = pages or {}
+        self._previous_chunks = chunks or {}
+        # Recorded by this conversion: page fingerprint -> page, chunk key -> output
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.chunks: Dict[str, str] = {}
+        self.pages_reused = 0
+        self.chunks_reused = 0
+
+    @property
+    def has_pages(self) -> bool:
+        return bool(self._previous_pages)
+
+    def page(self, fingerprint: str, page_num: int) -> Optional[Dict[str, Any]]:
+        """The previous version's page with ``fingerprint``, renumbered to ``page_num``."""
+        page = self._previous_pages.get(fingerprint)
+        if page is None:
+            return None
+        self.pages_reused += 1
+        return {**page, 'page': page_num}
+
+    def add_page(self, page: Dict[str, Any]) -> None:
+        if not page['needs_ocr']:
+            self.pages[page['fingerprint']] = page
+
+    def chunk(self, key: str) -> Optional[str]:
+        """The previous version's LLM output for the chunk with ``key``."""
+        output = self._previous_chunks.get(key)
+        if output is not None:
+            self.chunks_reused += 1
+        return output
+
+    def add_chunk(self, key: str, output: str) -> None:
+        self.chunks[key] = output
+
+
+def page_image_urls(pages: Iterable[Dict[str, Any]]) -> List[str]:
+    """URLs of the images and thumbnails of extracted ``pages``."""
+    return [url for page in pages for image in page['images'] for url in (image['url'], image.get('thumbnail')) if url]
+
+
+class LineageIndex:
+    """SQLite-backed store of the latest ``Revision`` of every lineage."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: int, image_store: Optional[ImageStore] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.image_store = image_store
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS lineage_revisions (
+            lineage TEXT PRIMARY KEY,
+            pages TEXT NOT NULL,
+            chunks TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lineage_revisions_updated_at ON lineage_revisions(updated_at)")
+        self._conn.commit()
+
+    def load(self, lineage: str) -> Revision:
+        """Start a new revision of ``lineage`` on top of its latest stored one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages, chunks, updated_at FROM lineage_revisions WHERE lineage = ?", (lineage,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.ttl_seconds:
+            return Revision()
+        return Revision(json.loads(row[0]), json.loads(row[1]))
+
+    def save(self, lineage: str, revision: Revision) -> None:
+        """Make ``revision`` the latest of ``lineage`` and evict entries over the limits."""
+        pages = json.dumps(revision.pages)
+        chunks = json.dumps(revision.chunks)
+        now = time.time()
+        with self._lock:
+            if self.image_store is not None:
+                self.image_store.retain(page_image_urls(revision.pages.values()))
+            # Taken before the previous revision lets go of the images they share
+            self._delete([lineage])
+            self._conn.execute(
+                "INSERT INTO lineage_revisions (lineage, pages, chunks, size, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (lineage, pages, chunks, len(pages) + len(chunks), now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _delete(self, lineages: Iterable[str]) -> None:
+        """Delete the revisions of ``lineages`` and release their images."""
+        lineages = [(lineage,) for lineage in lineages]
+        if self.image_store is not None:
+            urls = []
+            for lineage in lineages:
+                row = self._conn.execute("SELECT pages FROM lineage_revisions WHERE lineage = ?", lineage).fetchone()
+                if row is not None:
+                    urls.extend(page_image_urls(json.loads(row[0]).values()))
+            self.image_store.release(urls)
+        self._conn.executemany("DELETE FROM lineage_revisions WHERE lineage = ?", lineages)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute("SELECT lineage FROM lineage_revisions WHERE updated_at < ?", (now - self.ttl_seconds,)).fetchall()
+        self._delete(lineage for (lineage,) in expired)
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM lineage_revisions").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evict = []
+        for lineage, size in self._conn.execute("SELECT lineage, size FROM lineage_revisions ORDER BY updated_at ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append(lineage)
+            count -= 1
+            total -= size
+        self._delete(evict)
+        logger.info(f"Evicted {len(evict)} lineages from the lineage index")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,260 @@
+"""Formatter backends: the chat completion services formatting requests go to.
+
+- ``groq``: the Groq API (``GROQ_MODEL``, key from ``GROQ_API_KEY``)
+- ``openai``: any server speaking the OpenAI chat completions API (vLLM,
+  llama.cpp, LM Studio, ``benchmarks/stub_llm.py``) at ``OPENAI_BASE_URL``
+- ``ollama``: a local Ollama server, through its OpenAI-compatible endpoint
+- ``stub``: answers in-process after ``LLM_STUB_LATENCY`` seconds with a
+  deterministic response (the document content of the prompt), so the whole
+  pipeline can be load-tested offline
+
+Each backend keeps one client per event loop, so connections are reused
+across requests, and allows at most its own number of concurrent requests.
+Requests time out after ``LLM_TIMEOUT`` seconds; rate-limited (429), failed
+(5xx), timed out and unconnectable requests are retried up to
+``LLM_MAX_RETRIES`` times with exponential backoff and jitter (or after the
+server's ``Retry-After``).
+"""
+import asyncio
+import logging
+import random
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import groq
+import httpx
+
+import metrics
+from config import (
+    GROQ_MODEL,
+    LLM_CONTEXT_TOKENS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_STUB_LATENCY,
+    LLM_TIMEOUT,
+    OLLAMA_BASE_URL,
+    OLLAMA_CONTEXT_TOKENS,
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_CONTEXT_TOKENS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_MODEL,
+)
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    # "length" when the completion was cut off at max_tokens
+    finish_reason: Optional[str] = None
+
+
+class RetryableError(Exception):
+    """A request that failed in a way worth retrying."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class FormatterBackend:
+    """A chat completion service; subclasses implement ``_request``."""
+
+    name = "base"
+
+    def __init__(
+        self,
+        model: str,
+        context_tokens: int,
+        max_concurrency: int,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_backoff: float = LLM_RETRY_BACKOFF,
+    ):
+        self.model = model
+        self.context_tokens = context_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client: Any = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bound_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the backend and model for caches of its output."""
+        return f"{self.name}:{self.model}"
+
+    def _make_client(self) -> Any:
+        return None
+
+    def _bind(self) -> tuple[Any, asyncio.Semaphore]:
+        # Clients and semaphores belong to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._bound_loop is not loop:
+            self._client = self._make_client()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bound_loop = loop
+        return self._client, self._semaphore
+
+    async def _request(self, client: Any, messages: Messages, max_tokens: int, sampling: Dict[str, float]) -> Completion:
+        raise NotImplementedError
+
+    async def complete(self, messages: Messages, max_tokens: int, sampling: Dict[str, float]) -> Completion:
+        """Run one chat completion, retrying transient failures."""
+        client, semaphore = self._bind()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    with metrics.IN_FLIGHT.track("llm_request"), metrics.timed("llm_request"):
+                        try:
+                            completion = await asyncio.wait_for(self._request(client, messages, max_tokens, sampling), self.timeout)
+                        except asyncio.TimeoutError:
+                            raise RetryableError(f"{self.name} request timed out after {self.timeout:g}s") from None
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    metrics.LLM_REQUESTS.inc("error")
+                    raise
+                metrics.LLM_REQUESTS.inc("retry")
+                delay = max(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5), e.retry_after or 0.0)
+                logger.warning(f"{self.name} request failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                metrics.LLM_REQUESTS.inc("error")
+                raise
+            else:
+                metrics.LLM_REQUESTS.inc("ok")
+                metrics.LLM_TOKENS.inc("prompt", amount=completion.prompt_tokens)
+                metrics.LLM_TOKENS.inc("completion", amount=completion.completion_tokens)
+                return completion
+
+    async def aclose(self) -> None:
+        """Close the client of the current event loop."""
+        client, self._client, self._bound_loop = self._client, None, None
+        if client is not None and hasattr(client, "close"):
+            await client.close()
+
+
+class GroqBackend(FormatterBackend):
+    name = "groq"
+
+    def _make_client(self) -> groq.AsyncGroq:
+        # Retries and timeouts are handled by ``complete`` for all backends alike
+        return groq.AsyncGroq(max_retries=0, timeout=self.timeout)
+
+    async def _request(self, client: groq.AsyncGroq, messages: Messages, max_tokens: int, sampling: Dict[str, float]) -> Completion:
+        try:
+            response = await client.chat.completions.create(
+                messages=messages, model=self.model, max_tokens=max_tokens, **sampling,
+            )
+        except (groq.RateLimitError, groq.InternalServerError) as e:
+            raise RetryableError(str(e), _retry_after(e.response)) from e
+        except groq.APIConnectionError as e:  # includes timeouts
+            raise RetryableError(str(e)) from e
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content or "",
+            (usage.prompt_tokens or 0) if usage is not None else 0,
+            (usage.completion_tokens or 0) if usage is not None else 0,
+            response.choices[0].finish_reason,
+        )
+
+
+class OpenAICompatibleBackend(FormatterBackend):
+    """Any ``/chat/completions`` endpoint, spoken to over a pooled HTTP client."""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, context_tokens: int, max_concurrency: int, **kwargs):
+        super().__init__(model, context_tokens, max_concurrency, **kwargs)
+        self.name = name
+        self.base_url = base_url.rstrip("/") + "/"
+        self.api_key = api_key
+
+    @property
+    def fingerprint(self) -> str:
+        # Different endpoints may serve different builds under one model name
+        return f"{self.name}:{self.model}@{self.base_url}"
+
+    def _make_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+        )
+
+    async def _request(self, client: httpx.AsyncClient, messages: Messages, max_tokens: int, sampling: Dict[str, float]) -> Completion:
+        try:
+            response = await client.post("chat/completions", json={
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "stream": False,
+                **sampling,
+            })
+        except httpx.TransportError as e:  # connection errors and timeouts
+            raise RetryableError(str(e) or type(e).__name__) from e
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableError(f"HTTP {response.status_code} from {self.base_url}", _retry_after(response))
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        return Completion(
+            body["choices"][0]["message"]["content"] or "",
+            usage.get("prompt_tokens") or 0,
+            usage.get("completion_tokens") or 0,
+            body["choices"][0].get("finish_reason"),
+        )
+
+    async def aclose(self) -> None:
+        client, self._client, self._bound_loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+
+class StubBackend(FormatterBackend):
+    """Deterministic in-process backend: ``respond`` maps the user prompt to the answer."""
+
+    name = "stub"
+
+    def __init__(self, respond: Callable[[str], str], latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.respond = respond
+        self.latency = latency
+
+    async def _request(self, client: None, messages: Messages, max_tokens: int, sampling: Dict[str, float]) -> Completion:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.respond(messages[-1]["content"])
+        # Roughly four characters per token, like the stub server
+        return Completion(text, sum(len(message["content"]) for message in messages) // 4, len(text) // 4)
+
+
+# LLM_BACKEND name -> factory; the stub backend is given its response function
+BACKENDS: Dict[str, Callable[[Callable[[str], str]], FormatterBackend]] = {
+    "groq": lambda respond: GroqBackend(GROQ_MODEL, LLM_CONTEXT_TOKENS, LLM_MAX_CONCURRENCY),
+    "openai": lambda respond: OpenAICompatibleBackend(
+        "openai", OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL, OPENAI_CONTEXT_TOKENS, OPENAI_MAX_CONCURRENCY,
+    ),
+    "ollama": lambda respond: OpenAICompatibleBackend(
+        "ollama", OLLAMA_BASE_URL, "", OLLAMA_MODEL, OLLAMA_CONTEXT_TOKENS, OLLAMA_MAX_CONCURRENCY,
+    ),
+    "stub": lambda respond: StubBackend(
+        respond, LLM_STUB_LATENCY, model="echo", context_tokens=LLM_CONTEXT_TOKENS, max_concurrency=LLM_MAX_CONCURRENCY,
+    ),
+}
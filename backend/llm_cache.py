@@ -0,0 +1,215 @@
+"""Memo cache of LLM formatting output, one entry per chunk.
+
+Boilerplate (legal footers, standard procedure blocks, repeated appendices)
+turns up in many otherwise different documents, and formatting it again
+costs a model round trip every time. ``formatting`` looks every chunk up
+here before calling the model, keyed by ``formatting.chunk_key``: the
+normalized chunk text plus the prompts, model and sampling settings.
+
+A cache is a stack of tiers, checked in order; a hit in a later tier is
+copied into the earlier ones and new outputs go into all of them:
+
+- ``memory``: an in-process LRU dict, bounded by size and age
+- ``sqlite``: a local SQLite database that survives restarts, bounded by
+  size and age (least recently used entries go first)
+
+``LLM_CACHE_TIERS`` picks the tiers; other stores can be added to
+``TIERS``. All methods are blocking and thread-safe.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import LLM_CACHE_MAX_BYTES, LLM_CACHE_MEMORY_BYTES, LLM_CACHE_PATH, LLM_CACHE_TIERS, LLM_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def _entry_size(key: str, value: str) -> int:
+    return len(key) + len(value)
+
+
+class MemoryTier:
+    """In-process LRU of cached outputs."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size = 0
+        self._lock = threading.Lock()
+        # key -> (value, created_at), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: str) -> None:
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time())
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= _entry_size(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size}
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteTier:
+    """Cached outputs in a local SQLite database."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_outputs (
+            key TEXT PRIMARY KEY,
+            output TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_outputs_last_access ON llm_outputs(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT output, created_at FROM llm_outputs WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_outputs WHERE key = ?", (key,))
+                    self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_outputs SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_outputs (key, output, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, _entry_size(key, value), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_outputs WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_outputs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_outputs ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_outputs WHERE key = ?", evict)
+        logger.info(f"Evicted {len(evict)} entries from the LLM output cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_outputs").fetchone()
+        return {"entries": count, "bytes": total}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LlmCache:
+    """Tiers of cached LLM outputs, checked in order."""
+
+    def __init__(self, tiers: List[Any]):
+        self.tiers = tiers
+        self.hits = {tier.name: 0 for tier in tiers}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached output for ``key`` or ``None`` on a miss."""
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                # Keep it in the faster tiers for next time
+                for faster in self.tiers[:i]:
+                    faster.put(key, value)
+                with self._lock:
+                    self.hits[tier.name] += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            tier.put(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = dict(self.hits)
+            misses = self.misses
+        lookups = sum(hits.values()) + misses
+        return {
+            "tiers": {tier.name: {**tier.stats(), "hits": hits[tier.name]} for tier in self.tiers},
+            "hits": sum(hits.values()),
+            "misses": misses,
+            "hit_rate": round(sum(hits.values()) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        for tier in self.tiers:
+            tier.close()
+
+
+# LLM_CACHE_TIERS name -> factory
+TIERS: Dict[str, Callable[[], Any]] = {
+    "memory": lambda: MemoryTier(LLM_CACHE_MEMORY_BYTES, LLM_CACHE_TTL),
+    "sqlite": lambda: SqliteTier(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL),
+}
+
+
+def create_llm_cache(tiers: str = LLM_CACHE_TIERS) -> Optional[LlmCache]:
+    """Build the cache from a comma-separated list of tier names; ``None`` if it is empty."""
+    names = [name.strip().lower() for name in tiers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TIERS]
+    if unknown:
+        logger.warning(f"Ignoring unknown LLM cache tiers: {', '.join(unknown)}")
+    names = [name for name in names if name in TIERS]
+    return LlmCache([TIERS[name]() for name in names]) if names else None
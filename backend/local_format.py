@@ -0,0 +1,175 @@
+"""Deterministic markdown formatting without the LLM.
+
+Many documents already carry their structure: PDFs report font sizes, bold
+and monospace spans, DOCX files have heading and list styles. The PDF
+extractor uses ``block_markdown`` to turn PyMuPDF text blocks into markdown
+directly:
+
+- blocks of at most a few short lines set noticeably larger than the page's
+  body text become headings (``#`` to ``###`` by size ratio), short bold
+  lines at body size ``####`` headings
+- lines starting with a bullet glyph or a number become list items, nested
+  by their indentation
+- blocks set entirely in a monospace font become fenced code blocks
+
+``chunk_confidence`` scores how finished a piece of such markdown looks:
+text that is already marked up or reads as clean prose scores high, while
+leftovers the rules could not resolve (unmarked heading-like lines, bullet
+glyphs, lines broken up by the page layout, tables of numbers) score low.
+``formatting.format_document`` only sends low-confidence chunks to the LLM.
+"""
+import re
+import statistics
+from typing import Any, Dict, List
+
+from placeholders import LLM_PLACEHOLDER_RE, PLACEHOLDER_RE
+
+# PyMuPDF span flags
+FLAG_MONOSPACED = 8
+FLAG_BOLD = 16
+
+_BOLD_FONT_RE = re.compile(r'bold|black|heavy|semibold|demi', re.IGNORECASE)
+_MONO_FONT_RE = re.compile(r'mono|courier|consol|menlo|code|typewriter', re.IGNORECASE)
+_BULLET_RE = re.compile(r'^[•◦▪▫●○■□‣⁃∙·\-–*]\s+')
+_NUMBERED_RE = re.compile(r'^(\d{1,3})[.)]\s+')
+_TERMINAL_RE = re.compile(r'[.!?:;"\'”’)\]]$')
+_HYPHENATED_RE = re.compile(r'\w-\n\w')
+
+# Font size ratio to the body text -> heading level
+HEADING_RATIOS = ((1.6, 1), (1.3, 2), (1.12, 3))
+# Longest block (in words / lines) that can be a heading
+HEADING_MAX_WORDS = 20
+HEADING_MAX_LINES = 3
+# Points of indentation per list nesting level
+LIST_INDENT_POINTS = 15.0
+
+# Markdown that marks a paragraph as already structured
+_STRUCTURED_RE = re.compile(r'^(#{1,6}\s|```|\||>|[-*+]\s|\d+\.\s|!\[|---$)')
+
+
+def _line_text(line: Dict[str, Any]) -> str:
+    return "".join(span["text"] for span in line["spans"])
+
+
+def block_text(block: Dict[str, Any]) -> str:
+    """Plain text of a PyMuPDF ``dict`` text block, as ``get_text("blocks")`` reports it."""
+    return "\n".join(_line_text(line) for line in block["lines"])
+
+
+def _is_bold(span: Dict[str, Any]) -> bool:
+    return bool(span["flags"] & FLAG_BOLD) or bool(_BOLD_FONT_RE.search(span["font"]))
+
+
+def _is_mono(span: Dict[str, Any]) -> bool:
+    return bool(span["flags"] & FLAG_MONOSPACED) or bool(_MONO_FONT_RE.search(span["font"]))
+
+
+def body_font_size(blocks: List[Dict[str, Any]]) -> float:
+    """The font size most of the text of ``blocks`` is set in (0 if there is none)."""
+    chars: Dict[float, int] = {}
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                size = round(span["size"] * 2) / 2
+                chars[size] = chars.get(size, 0) + len(span["text"].strip())
+    chars = {size: count for size, count in chars.items() if count}
+    return max(chars, key=chars.get) if chars else 0.0
+
+
+def _heading_level(block: Dict[str, Any], spans: List[Dict[str, Any]], text: str, body_size: float):
+    words = len(text.split())
+    if not body_size or not words or words > HEADING_MAX_WORDS or len(block["lines"]) > HEADING_MAX_LINES:
+        return None
+    if text.endswith((".", ",", ";")):
+        return None
+    # Size of most of the block's characters
+    sizes: Dict[float, int] = {}
+    for span in spans:
+        sizes[span["size"]] = sizes.get(span["size"], 0) + len(span["text"])
+    ratio = max(sizes, key=sizes.get) / body_size
+    for min_ratio, level in HEADING_RATIOS:
+        if ratio >= min_ratio:
+            return level
+    if ratio >= 0.95 and len(block["lines"]) == 1 and words <= 12 and all(_is_bold(span) for span in spans):
+        return 4
+    return None
+
+
+def _list_markdown(block: Dict[str, Any]) -> str:
+    items = []  # (indent in points, marker, text)
+    for line in block["lines"]:
+        text = _line_text(line).strip()
+        if not text:
+            continue
+        bullet = _BULLET_RE.match(text)
+        number = _NUMBERED_RE.match(text)
+        if bullet or number or not items:
+            match = bullet or number
+            marker = f"{number.group(1)}." if number else "-"
+            items.append([line["bbox"][0], marker, text[match.end():] if match else text])
+        else:
+            # Continuation of the previous item
+            items[-1][2] += " " + text
+    left = min(indent for indent, _, _ in items)
+    out = []
+    for indent, marker, text in items:
+        level = min(int((indent - left) / LIST_INDENT_POINTS + 0.5), 3)
+        out.append(f"{'   ' * level}{marker} {text}")
+    return "\n".join(out)
+
+
+def block_markdown(block: Dict[str, Any], body_size: float) -> str:
+    """Markdown for a PyMuPDF ``dict`` text block on a page whose body text is ``body_size``."""
+    spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+    text = block_text(block).strip()
+    if not spans or not text:
+        return text
+    if all(_is_mono(span) for span in spans):
+        return f"```\n{block_text(block).rstrip()}\n```"
+    level = _heading_level(block, spans, text, body_size)
+    if level is not None:
+        return f"{'#' * level} {' '.join(text.split())}"
+    if _BULLET_RE.match(text) or _NUMBERED_RE.match(text):
+        return _list_markdown(block)
+    return text
+
+
+def _paragraph_confidence(paragraph: str) -> float:
+    if _STRUCTURED_RE.match(paragraph):
+        return 1.0
+    lines = [line.strip() for line in paragraph.split("\n") if line.strip()]
+    words = paragraph.split()
+    score = 1.0
+    if len(lines) == 1 and len(words) <= 12 and not _TERMINAL_RE.search(paragraph):
+        # Reads like a heading nobody marked as one
+        score = min(score, 0.3)
+    if any(_BULLET_RE.match(line) or _NUMBERED_RE.match(line) for line in lines):
+        score = min(score, 0.3)
+    if len(lines) >= 3 and statistics.median(len(line) for line in lines) < 40:
+        # Short fragments: a table, a form or a broken-up layout
+        score = min(score, 0.4)
+    non_space = sum(1 for ch in paragraph if not ch.isspace())
+    if non_space and sum(1 for ch in paragraph if ch.isalpha()) / non_space < 0.6:
+        score = min(score, 0.3)
+    if len(words) > 12 and not _TERMINAL_RE.search(paragraph):
+        # Cut off, e.g. at a page or column break
+        score = min(score, 0.7)
+    if _HYPHENATED_RE.search(paragraph):
+        score = min(score, 0.8)
+    return score
+
+
+def chunk_confidence(text: str) -> float:
+    """How confident the local formatting of ``text`` is, from 0 to 1.
+
+    The average of each paragraph's score, weighted by its length; image
+    placeholders do not count.
+    """
+    total = weighted = 0.0
+    for paragraph in text.split("\n\n"):
+        paragraph = LLM_PLACEHOLDER_RE.sub("", PLACEHOLDER_RE.sub("", paragraph)).strip()
+        if not paragraph:
+            continue
+        total += len(paragraph)
+        weighted += len(paragraph) * _paragraph_confidence(paragraph)
+    return weighted / total if total else 1.0
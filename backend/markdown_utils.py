@@ -0,0 +1,149 @@
+"""Markdown post-processing helpers."""
+import re
+from typing import Iterable, Iterator, Optional
+
+# All patterns are anchored by re.match
+_INDENTED_TEXT_RE = re.compile(r' {4,}(?![\-*+\d.])')
+_IMAGE_LINE_RE = re.compile(r'!\[.*\]\(.*\)$')
+_HEADING_RE = re.compile(r'#+\s+')
+_LIST_ITEM_RE = re.compile(r'(\s*)([•○▪•\-*+]|\d+[.)])\s+(.+)')
+_SINGLE_BACKTICK_RE = re.compile(r'(?<!`)`(?!`)')
+_NUMBERED_RE = re.compile(r'\s*\d+\.')
+
+_BULLET_CHARS = '•○▪-*+'
+_NO_SPACE_BEFORE_IMAGE = ('!', '>', '#')
+_NO_SPACE_AFTER_IMAGE = (' ', '\t', '-', '*', '1.', '!')
+_BLOCK_STARTS = ('!', '>', '#', '-', '*', '1.', '```')
+
+
+def _clean_line(line: str) -> str:
+    """Clean up a single line of markdown."""
+    # Remove accidental code blocks (4+ spaces at start of line that aren't in a list)
+    if line.startswith('    ') and _INDENTED_TEXT_RE.match(line):
+        line = line.lstrip()
+
+    # Fix lines that start with backticks but aren't code blocks (this also
+    # covers inline-code-only lines, nothing is left to strip afterwards)
+    stripped = line.strip()
+    if stripped.startswith('`') and not stripped.startswith('```'):
+        line = line.replace('`', '').strip()
+    return line
+
+
+def _finish_line(line: str) -> str:
+    """Final per-line fixes applied to every output line, code blocks included."""
+    # Replace single backticks that aren't part of code blocks with single quotes
+    if '`' in line and not ('```' in line or '`python' in line or '`bash' in line):
+        line = _SINGLE_BACKTICK_RE.sub("'", line)
+
+    # Lines indented like code that were meant to be regular text
+    if line[:4].isspace():
+        stripped = line.strip()
+        if stripped and not stripped.startswith(_BLOCK_STARTS) and not _NUMBERED_RE.match(line):
+            line = line.lstrip()
+    return line
+
+
+def iter_beautified_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Post-process markdown line by line in a single pass.
+
+    A state machine over ``lines`` (without line endings) with one line of
+    lookahead; yields the output lines. See ``beautify_markdown``.
+    """
+    in_code_block = False
+    in_list = False
+    list_indent = 0
+    # Last line emitted before the final fixes (None until the first one)
+    last: Optional[str] = None
+
+    lines = iter(lines)
+    line = next(lines, None)
+    while line is not None:
+        next_line = next(lines, None)
+        stripped = line.strip()
+
+        # Handle code blocks
+        if stripped.startswith('```'):
+            in_code_block = not in_code_block
+            last = line
+            yield _finish_line(line)
+
+        elif in_code_block:
+            last = line
+            yield _finish_line(line)
+
+        # Preserve image tags exactly as they are
+        elif stripped.startswith('![') and _IMAGE_LINE_RE.match(stripped):
+            if last and last.strip() and not last.startswith(_NO_SPACE_BEFORE_IMAGE):
+                yield ''  # Add space before image if needed
+            last = line
+            yield _finish_line(line)
+            if next_line is not None and next_line.strip() and not next_line.startswith(_NO_SPACE_AFTER_IMAGE):
+                last = ''
+                yield ''  # Add space after image if needed
+
+        # Only one empty line in a row
+        elif not stripped:
+            if last:
+                last = ''
+                yield ''
+
+        else:
+            line = _clean_line(line)
+
+            # Headings get an empty line before and after
+            if line.startswith('#') and _HEADING_RE.match(line):
+                if last:
+                    yield ''
+                yield _finish_line(line)
+                last = ''
+                yield ''
+                line = next_line
+                continue
+
+            first = line.lstrip()[:1]
+            list_match = first and (first in _BULLET_CHARS or first.isdecimal()) and _LIST_ITEM_RE.match(line)
+            if list_match:
+                indent, marker, content = list_match.groups()
+                current_indent = len(indent)
+
+                # Adjust list level
+                if current_indent > list_indent + 2:
+                    current_indent = list_indent + 2
+                elif current_indent < list_indent - 2:
+                    current_indent = max(0, list_indent - 2)
+
+                # Normalize the marker
+                if marker.isdigit() or marker.endswith(('.', ')')):
+                    line = ' ' * current_indent + '1. ' + content
+                else:
+                    line = ' ' * current_indent + '- ' + content
+
+                list_indent = current_indent
+                in_list = True
+            elif in_list and line.startswith('  '):
+                # Continuation lines in lists
+                line = ' ' * (list_indent + 2) + line.lstrip()
+            else:
+                in_list = False
+                list_indent = 0
+
+            # Cleaning can empty a line; still only one empty line in a row
+            if last != '' or line.strip():
+                last = line
+                yield _finish_line(line)
+
+        line = next_line
+
+
+def beautify_markdown(markdown: str) -> str:
+    """
+    Enhanced post-processing for professional Markdown:
+    - Fixes code block formatting issues
+    - Preserves image tags in their exact positions
+    - Converts instructional text to proper paragraphs
+    - Cleans up accidental code blocks and backticks
+    - Maintains proper spacing and indentation
+    """
+    # Join with proper spacing
+    return '\n'.join(iter_beautified_lines(markdown.splitlines())).strip() + '\n'
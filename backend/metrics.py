@@ -0,0 +1,233 @@
+"""Built-in metrics, exposed in the Prometheus text format on ``/api/metrics``.
+
+Counters, gauges and histograms live in a per-process registry. Extraction
+worker processes record into their own registry, which ``ExtractionPool``
+drains after every job and merges into the app's, so stages that run in the
+workers (opening PDFs, per-page extraction, saving images, OCR) show up
+alongside the ones that run in the app.
+
+With ``METRICS_ENABLED`` off every recording call returns after a single
+flag check and ``timed`` hands out a shared no-op context manager.
+
+Optionally (``TRACE_IDS_ENABLED``) each request gets a trace id, taken from
+an incoming ``X-Request-ID`` header or generated, which is returned in the
+response headers and added to every log line written while handling it.
+"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED
+
+ENABLED = METRICS_ENABLED
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[str, ...]
+
+_registry: Dict[str, "_Metric"] = {}
+
+# Handed out instead of a timer when metrics are disabled
+_NOOP = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _labels(self, labels: Labels, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._labels(labels)} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def _track(self, labels: Labels) -> Iterator[None]:
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def track(self, *labels: str):
+        """Context manager counting the code it wraps as in flight."""
+        return self._track(labels) if ENABLED else _NOOP
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        if not ENABLED:
+            return
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket = self._labels(labels, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                bucket = self._labels(labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {count}")
+                lines.append(f"{self.name}_sum{self._labels(labels)} {total:g}")
+                lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+
+# --- Pipeline metrics ---
+STAGE_SECONDS = Histogram("dokuai_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+IN_FLIGHT = Gauge("dokuai_in_flight", "Work currently in progress", ["stage"])
+UPLOAD_BYTES = Counter("dokuai_upload_bytes_total", "Bytes of uploaded documents received")
+OUTPUT_BYTES = Counter("dokuai_markdown_bytes_total", "Bytes of markdown produced")
+PAGES = Counter("dokuai_pages_total", "PDF pages extracted", ["method"])
+IMAGES = Counter("dokuai_images_total", "Images extracted from documents")
+CONVERSIONS = Counter("dokuai_conversions_total", "Finished conversions", ["format", "result"])
+LLM_TOKENS = Counter("dokuai_llm_tokens_total", "Tokens used by LLM formatting calls", ["kind"])
+LLM_REQUESTS = Counter("dokuai_llm_requests_total", "LLM formatting calls", ["result"])
+CHUNKS = Counter("dokuai_chunks_total", "Formatted chunks by formatter", ["formatter"])
+CACHE_REQUESTS = Counter("dokuai_cache_requests_total", "Cache lookups", ["cache", "result"])
+
+
+@contextmanager
+def _timer(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+
+def timed(stage: str):
+    """Context manager recording the duration of ``stage``."""
+    return _timer(stage) if ENABLED else _NOOP
+
+
+def render() -> str:
+    """The whole registry in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def drain() -> List[Tuple[str, Dict[Labels, Any]]]:
+    """Return and reset this process's counters and histograms.
+
+    Used in worker processes; gauges describe the worker itself and are not
+    included.
+    """
+    if not ENABLED:
+        return []
+    snapshot = []
+    for metric in _registry.values():
+        if isinstance(metric, Gauge):
+            continue
+        with metric._lock:
+            if metric._values:
+                snapshot.append((metric.name, metric._values))
+                metric._values = {}
+    return snapshot
+
+
+def merge(snapshot: List[Tuple[str, Dict[Labels, Any]]]):
+    """Add a snapshot taken by ``drain`` in another process to this registry."""
+    for name, values in snapshot:
+        metric = _registry.get(name)
+        if metric is None:
+            continue
+        with metric._lock:
+            for labels, value in values.items():
+                if isinstance(metric, Histogram):
+                    state = metric._values.setdefault(labels, [[0] * len(metric.buckets), 0.0, 0])
+                    state[0] = [a + b for a, b in zip(state[0], value[0])]
+                    state[1] += value[1]
+                    state[2] += value[2]
+                else:
+                    metric._values[labels] = metric._values.get(labels, 0.0) + value
+
+
+def run_and_drain(fn, *args):
+    """Run ``fn(*args)`` in a worker and return its result with the metrics it recorded."""
+    return fn(*args), drain()
+
+
+# --- Trace ids ---
+_trace_id: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """Set the trace id for the current request (and tasks started from it)."""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds ``trace_id`` to log records for use in the log format."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get()
+        return True
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class ImageData(BaseModel):
+    data: str
+    type: str
+    description: str = "Document image"
+    placeholder: str = ""
+    # Small preview of the image, if it is larger than a thumbnail
+    thumbnail: Optional[str] = None
+
+
+class ConversionResponse(BaseModel):
+    status: str = "success"
+    markdown: str
+    filename: str
+    images: List[ImageData] = []
+    placeholder_map: Dict[str, str] = {}
+
+
+# --- 1. Standardize placeholder format ---
+PLACEHOLDER_FORMAT = "[[IMG_PLACEHOLDER_{}]]"
+
+
+class ConversionProgress(BaseModel):
+    """Per-stage progress of one conversion, updated as the pipeline runs."""
+    stage: str = "queued"
+    pages_total: int = 0
+    pages_extracted: int = 0
+    chunks_total: int = 0
+    chunks_formatted: int = 0
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    progress: ConversionProgress
+    created_at: datetime
+    updated_at: datetime
+    error: Optional[str] = None
+    result: Optional[ConversionResponse] = None
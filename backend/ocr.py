@@ -0,0 +1,184 @@
+"""OCR for PDF pages without a text layer.
+
+Scanned pages come out of ``page.get_text`` empty. ``ocr_page`` rasterizes a
+single page with pdf2image at ``OCR_DPI``, runs Tesseract on it and returns
+paragraph blocks in PDF points, so they go through the same layout engine as
+native text blocks. Results are cached on disk by page hash (up to
+``OCR_CACHE_MAX_BYTES``, for ``OCR_CACHE_TTL`` seconds), so converting the
+same scan again costs no OCR at all. Failed OCR is not cached.
+
+Like ``extraction``, this module is synchronous and runs inside the
+extraction worker processes.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import pytesseract
+from pdf2image import convert_from_path
+
+import metrics
+from config import OCR_CACHE_MAX_BYTES, OCR_CACHE_PATH, OCR_CACHE_TTL, OCR_DPI, OCR_LANG, OCR_THREADS
+
+logger = logging.getLogger(__name__)
+
+# (x0, y0, x1, y1, text) in PDF points
+OcrBlock = Tuple[float, float, float, float, str]
+
+
+class OcrCache:
+    """OCR'd pages in a local SQLite database, shared by the worker processes.
+
+    Entries expire after ``ttl_seconds`` and the least recently used ones are
+    evicted when their total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_pages (
+            key TEXT PRIMARY KEY,
+            blocks TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_pages)")}
+        if "size" not in columns:  # created before the cache was bounded
+            conn.execute("ALTER TABLE ocr_pages ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE ocr_pages ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE ocr_pages SET size = length(key) + length(blocks), last_access = created_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_pages_last_access ON ocr_pages(last_access)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[List[OcrBlock]]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT blocks, created_at FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                conn.execute("DELETE FROM ocr_pages WHERE key = ?", (key,))
+                conn.commit()
+            return None
+        conn.execute("UPDATE ocr_pages SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return [tuple(block) for block in json.loads(row[0])]
+
+    def put(self, key: str, blocks: List[OcrBlock]) -> None:
+        payload = json.dumps(blocks)
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO ocr_pages (key, blocks, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(key) + len(payload), now, now),
+        )
+        self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM ocr_pages WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in conn.execute("SELECT key, size FROM ocr_pages ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM ocr_pages WHERE key = ?", evict)
+        logger.info(f"Evicted {len(evict)} pages from the OCR cache")
+
+
+_cache: Optional[OcrCache] = None
+
+
+def get_ocr_cache() -> OcrCache:
+    """Return this process's OCR cache (created on first use)."""
+    global _cache
+    if _cache is None:
+        _cache = OcrCache(OCR_CACHE_PATH, OCR_CACHE_TTL, OCR_CACHE_MAX_BYTES)
+    return _cache
+
+
+def page_hash(doc, page) -> str:
+    """Hash what a page renders from: its content stream, its images and the OCR settings."""
+    digest = hashlib.sha256(f"dpi={OCR_DPI};lang={OCR_LANG}\n".encode())
+    digest.update(page.read_contents())
+    for img in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(img[0]) or b"")
+    return digest.hexdigest()
+
+
+def recognize(image, dpi: int = OCR_DPI, lang: str = OCR_LANG) -> List[OcrBlock]:
+    """OCR a page image into paragraph blocks, scaled from pixels to points."""
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    scale = 72.0 / dpi
+    paragraphs = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word or float(data['conf'][i]) < 0:
+            continue
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        paragraph = paragraphs.setdefault((data['block_num'][i], data['par_num'][i]), {'lines': {}, 'box': [left, top, right, bottom]})
+        paragraph['lines'].setdefault(data['line_num'][i], []).append(word)
+        box = paragraph['box']
+        box[0], box[1], box[2], box[3] = min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)
+
+    blocks = []
+    for paragraph in paragraphs.values():
+        # Same shape as PyMuPDF text blocks: words joined by spaces, lines by newlines
+        text = "\n".join(" ".join(words) for _, words in sorted(paragraph['lines'].items()))
+        x0, y0, x1, y1 = (value * scale for value in paragraph['box'])
+        blocks.append((x0, y0, x1, y1, text))
+    return blocks
+
+
+def ocr_page(doc, page, page_num: int) -> Optional[List[OcrBlock]]:
+    """Return OCR text blocks for page ``page_num`` of ``doc`` (opened from a file).
+
+    Returns None if OCR is unavailable (Tesseract or Poppler not installed)
+    or fails, in which case the page is converted without text as before.
+    """
+    cache = get_ocr_cache()
+    key = page_hash(doc, page)
+    blocks = cache.get(key)
+    if blocks is not None:
+        metrics.CACHE_REQUESTS.inc("ocr", "hit")
+        return blocks
+    metrics.CACHE_REQUESTS.inc("ocr", "miss")
+    try:
+        # Pages are OCR'd in parallel by the worker pool; Tesseract would also
+        # start a thread per core unless told otherwise, oversubscribing the CPU
+        os.environ["OMP_THREAD_LIMIT"] = str(OCR_THREADS)
+        start = time.perf_counter()
+        with metrics.timed("ocr_rasterize"):
+            images = convert_from_path(doc.name, dpi=OCR_DPI, first_page=page_num, last_page=page_num, thread_count=OCR_THREADS)
+        with metrics.timed("ocr_recognize"):
+            blocks = recognize(images[0])
+        logger.info(f"OCR of page {page_num}: {len(blocks)} blocks in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"OCR of page {page_num} failed: {str(e)}")
+        return None
+    cache.put(key, blocks)
+    return blocks
@@ -0,0 +1,166 @@
+"""Async orchestration of the conversion pipeline.
+
+The functions here decide how work is split across the extraction worker
+pool and stitch the results back together. They run on the event loop and
+never do CPU-heavy or blocking work themselves.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import extraction
+import metrics
+from config import MAX_UPLOAD_BYTES, PDF_SHARD_MIN_PAGES, UPLOAD_CHUNK_BYTES
+from lineage import Revision
+from models import ConversionProgress, ImageData
+from workers import ExtractionPool
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds ``MAX_UPLOAD_BYTES``."""
+
+
+class SpooledUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+async def spool_upload(upload, suffix: str, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_BYTES) -> SpooledUpload:
+    """Stream an upload into a temp file, hashing it on the way.
+
+    Only one chunk is held in memory at a time, and the size limit is
+    enforced while streaming. The caller owns (and must delete) the file.
+    """
+    start = time.perf_counter()
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the upload limit of {max_bytes} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start, "upload")
+    metrics.UPLOAD_BYTES.inc(amount=size)
+    return SpooledUpload(path, size, digest.hexdigest())
+
+
+async def _plan_pdf_pages(pool: ExtractionPool, pdf_path: str, page_count: int, revision: Optional[Revision]) -> tuple[Dict[int, Dict[str, Any]], List[int]]:
+    """Split pages into those the previous revision already has and those to extract."""
+    if revision is None or not revision.has_pages:
+        return {}, list(range(1, page_count + 1))
+    shards = extraction.plan_page_shards(page_count, pool.max_workers, PDF_SHARD_MIN_PAGES)
+    fingerprints = [
+        fingerprint
+        for shard in await pool.run_many(extraction.pdf_page_fingerprints, [(pdf_path, first, last) for first, last in shards])
+        for fingerprint in shard
+    ]
+    reused = {}
+    changed = []
+    for page_num, fingerprint in enumerate(fingerprints, 1):
+        page = revision.page(fingerprint, page_num)
+        if page is None:
+            changed.append(page_num)
+        else:
+            reused[page_num] = page
+    logger.info(f"Reusing {len(reused)} of {page_count} pages from the previous revision")
+    return reused, changed
+
+
+async def extract_pdf(
+    pool: ExtractionPool,
+    pdf_path: str,
+    progress: Optional[ConversionProgress] = None,
+    on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_shard_pages: Optional[int] = None,
+    revision: Optional[Revision] = None,
+) -> tuple[str, List[ImageData], Dict[str, str]]:
+    """Extract a PDF, sharding its pages across the worker pool.
+
+    Every worker reopens the file at ``pdf_path`` and extracts a share of
+    the pages; they are stitched back in order, so the markdown is
+    identical to a single-process extraction. Pages without a text layer are
+    OCR'd in parallel as soon as their shard comes back.
+
+    ``on_page`` is called with every extracted page (see
+    ``extraction.extract_pdf_pages``) in page order, as soon as it and all
+    pages before it are done. ``max_shard_pages`` caps the shard size so
+    the first pages arrive quickly.
+
+    With a ``revision``, pages whose fingerprint its lineage already has are
+    taken from there and only the others are extracted; all pages are
+    recorded on it for the next revision.
+    """
+    page_count = await pool.run(extraction.pdf_page_count, pdf_path)
+    reused, changed = await _plan_pdf_pages(pool, pdf_path, page_count, revision)
+    if max_shard_pages:
+        shards = extraction.plan_page_shards(len(changed), -(-len(changed) // max_shard_pages), 1)
+    else:
+        shards = extraction.plan_page_shards(len(changed), pool.max_workers, PDF_SHARD_MIN_PAGES)
+    if len(shards) > 1:
+        logger.info(f"Extracting {len(changed)} pages in {len(shards)} shards")
+
+    done: Dict[int, Dict[str, Any]] = {}
+    next_page = 1
+    ocr_batches: List[asyncio.Future] = []
+
+    def page_done(page):
+        nonlocal next_page
+        done[page['page']] = page
+        while next_page in done:
+            if on_page is not None:
+                on_page(done[next_page])
+            next_page += 1
+
+    def shard_done(shard_pages):
+        if progress is not None:
+            progress.pages_extracted += len(shard_pages)
+        # Scanned pages have no text layer: OCR them one page per job so they
+        # spread over all workers, while the remaining shards are extracted
+        ocr_pages = [page['page'] for page in shard_pages if page['needs_ocr']]
+        if ocr_pages:
+            logger.info(f"Running OCR on {len(ocr_pages)} pages without a text layer")
+            ocr_batches.append(asyncio.ensure_future(
+                pool.run_many(extraction.ocr_pdf_page, [(pdf_path, page_num) for page_num in ocr_pages], on_result=page_done)
+            ))
+        for page in shard_pages:
+            if not page['needs_ocr']:
+                page_done(page)
+
+    if progress is not None:
+        progress.pages_total = page_count
+    if reused:
+        metrics.PAGES.inc("reused", amount=len(reused))
+        shard_done(list(reused.values()))
+    try:
+        await pool.run_many(
+            extraction.extract_pdf_page_numbers,
+            [(pdf_path, changed[first - 1:last]) for first, last in shards],
+            on_result=shard_done,
+        )
+        await asyncio.gather(*ocr_batches)
+    finally:
+        for batch in ocr_batches:
+            batch.cancel()
+    pages = [done[page_num] for page_num in range(1, page_count + 1)]
+    if revision is not None:
+        for page in pages:
+            revision.add_page(page)
+    # Stitching is string work proportional to the document, keep it off the event loop
+    return await asyncio.to_thread(extraction.assemble_pdf_pages, pages)
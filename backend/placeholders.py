@@ -0,0 +1,55 @@
+"""Image placeholder substitution and reference checks.
+
+Extraction marks image positions with ``models.PLACEHOLDER_FORMAT`` tokens
+and the LLM step swaps them for ``LLM_PLACEHOLDER_FORMAT`` tokens it is told
+not to touch. Replacing them with one ``str.replace`` per image rescans the whole
+document for every image; here each placeholder style is a single
+precompiled pattern and a document is substituted in one pass with a dict
+lookup per match, whatever the number of images.
+"""
+import os
+import re
+from typing import Dict, Iterable, List
+
+LLM_PLACEHOLDER_FORMAT = "__IMG_PLACEHOLDER_{}__"
+
+# Match any models.PLACEHOLDER_FORMAT / LLM_PLACEHOLDER_FORMAT token
+PLACEHOLDER_RE = re.compile(r'\[\[IMG_PLACEHOLDER_[0-9]+\]\]')
+LLM_PLACEHOLDER_RE = re.compile(r'__IMG_PLACEHOLDER_[0-9]+__')
+
+# Below this, a shared URL prefix is too unspecific to search for
+_MIN_PREFIX = 8
+
+
+def image_markdown(url: str) -> str:
+    return f"![]({url})"
+
+
+def substitute(text: str, replacements: Dict[str, str], pattern: re.Pattern = PLACEHOLDER_RE) -> str:
+    """Replace every ``pattern`` token that is a key of ``replacements``.
+
+    Tokens without a replacement are left as they are.
+    """
+    if not replacements:
+        return text
+    return pattern.sub(lambda match: replacements.get(match.group(0), match.group(0)), text)
+
+
+def missing_references(text: str, urls: Iterable[str]) -> List[str]:
+    """Return the ``urls`` that do not occur anywhere in ``text``, in order.
+
+    Equivalent to ``[url for url in urls if url not in text]``, but ``text``
+    is scanned once for the prefix all the URLs share (the image store's
+    base URL) instead of once per URL.
+    """
+    urls = list(urls)
+    prefix = os.path.commonprefix(urls) if urls else ""
+    if len(prefix) < _MIN_PREFIX:
+        return [url for url in urls if url not in text]
+    lengths = {len(url) for url in urls}
+    present = set()
+    start = text.find(prefix)
+    while start != -1:
+        present.update(text[start:start + length] for length in lengths)
+        start = text.find(prefix, start + 1)
+    return [url for url in urls if url not in present]
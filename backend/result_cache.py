@@ -0,0 +1,142 @@
+"""Content-addressed cache of finished conversions.
+
+Entries are keyed by a hash of the uploaded bytes plus everything that
+influences the output (extraction settings, prompt, model, cache format
+version) and stored in a local SQLite database. Entries expire after a TTL
+and the least recently used ones are evicted when the entry count or total
+size exceeds its limit.
+Given an image store, every entry holds a reference to the images of its
+response until it is replaced, expires or is evicted.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from image_store import ImageStore
+from models import ConversionResponse
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached payload or the conversion pipeline changes incompatibly
+CACHE_FORMAT_VERSION = "2"
+
+
+def cache_key(content_hash: str, *fingerprints: str) -> str:
+    """Combine a file content hash with the fingerprints of the pipeline stages."""
+    return hashlib.sha256("\0".join([CACHE_FORMAT_VERSION, *fingerprints, content_hash]).encode()).hexdigest()
+
+
+def response_image_urls(response: ConversionResponse) -> List[str]:
+    """URLs of the images and thumbnails ``response`` references."""
+    return [url for img in response.images for url in (img.data, img.thumbnail) if url]
+
+
+class ConversionCache:
+    """SQLite-backed LRU + TTL cache of ``ConversionResponse`` objects."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: int, image_store: Optional[ImageStore] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.image_store = image_store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversion_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_conversion_cache_last_access ON conversion_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[ConversionResponse]:
+        """Return the cached response for ``key`` or ``None`` on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM conversion_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._delete([key])
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE conversion_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return ConversionResponse.model_validate_json(row[0])
+
+    def put(self, key: str, response: ConversionResponse) -> None:
+        """Store ``response`` under ``key`` and evict entries over the limits."""
+        payload = response.model_dump_json()
+        now = time.time()
+        with self._lock:
+            if self.image_store is not None:
+                self.image_store.retain(response_image_urls(response))
+            # Taken before the replaced entry lets go of the images they share
+            self._delete([key])
+            self._conn.execute(
+                "INSERT INTO conversion_cache (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _delete(self, keys: Iterable[str]) -> None:
+        """Delete the entries ``keys`` and release their images."""
+        keys = [(key,) for key in keys]
+        if self.image_store is not None:
+            urls = []
+            for key in keys:
+                row = self._conn.execute("SELECT response FROM conversion_cache WHERE key = ?", key).fetchone()
+                if row is not None:
+                    urls.extend(response_image_urls(ConversionResponse.model_validate_json(row[0])))
+            self.image_store.release(urls)
+        self._conn.executemany("DELETE FROM conversion_cache WHERE key = ?", keys)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute("SELECT key FROM conversion_cache WHERE created_at < ?", (now - self.ttl_seconds,)).fetchall()
+        self._delete(key for (key,) in expired)
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM conversion_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until both limits hold
+        evict = []
+        for key, size in self._conn.execute("SELECT key, size FROM conversion_cache ORDER BY last_access ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append(key)
+            count -= 1
+            total -= size
+        self._delete(evict)
+        logger.info(f"Evicted {len(evict)} entries from the conversion cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM conversion_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
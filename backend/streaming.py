@@ -0,0 +1,114 @@
+"""Event stream for ``POST /api/convert?stream=ndjson`` (or ``stream=sse``).
+
+Clients that opt in see the conversion while it runs instead of a single
+response at the end:
+
+- ``start``: filename and upload size
+- ``image``: an extracted image (``ImageData``), as soon as its page is done
+- ``page``: raw text of the next PDF page, in page order, with image markdown
+  (DOCX documents arrive as one piece, with ``page`` null)
+- ``markdown``: the next piece of formatted markdown, in order, as chunks
+  come back from the model; concatenated they preview the document
+- ``done``: a summary plus the final ``ConversionResponse``, whose markdown
+  (post-processed as a whole) is authoritative
+- ``error``: status code and detail when the conversion fails
+
+With ``ndjson`` each event is one JSON object per line with an ``event``
+field; with ``sse`` it is a Server-Sent Event carrying the same object
+without that field. When nothing happens for ``STREAM_HEARTBEAT_INTERVAL``
+seconds a keep-alive (SSE comment or ``heartbeat`` event) is sent so
+proxies do not drop the connection.
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+import extraction
+import placeholders
+from config import STREAM_HEARTBEAT_INTERVAL
+from models import ConversionProgress, ConversionResponse, ImageData
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+class ConversionEvents:
+    """Collects the events of one conversion for a streaming response."""
+
+    def __init__(self, stream_format: str, heartbeat_interval: float = STREAM_HEARTBEAT_INTERVAL):
+        self.format = stream_format
+        self.media_type = MEDIA_TYPES[stream_format]
+        self.heartbeat_interval = heartbeat_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._started = time.perf_counter()
+        # Images of the PDF pages emitted so far, numbered as the final document numbers them
+        self._images: List[ImageData] = []
+        self._placeholder_map: Dict[str, str] = {}
+
+    def _encode(self, event: str, data: Dict[str, Any]) -> str:
+        if self.format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, **data}) + "\n"
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        self._queue.put_nowait(self._encode(event, data))
+
+    def start(self, filename: str, size: int):
+        self.emit("start", {"filename": filename, "size": size})
+
+    def pdf_page(self, page: Dict[str, Any]):
+        """Emit an extracted PDF page; used as ``pipeline.extract_pdf``'s ``on_page``."""
+        first = len(self._images)
+        text = extraction.assemble_pdf_page(page, self._images, self._placeholder_map)
+        new_images = self._images[first:]
+        for image in new_images:
+            self.emit("image", image.model_dump())
+        text = placeholders.substitute(text, {img.placeholder: placeholders.image_markdown(img.data) for img in new_images})
+        self.emit("page", {"page": page['page'], "text": text})
+
+    def document(self, text: str, images: List[ImageData]):
+        """Emit a document extracted in one piece (DOCX)."""
+        for image in images:
+            self.emit("image", image.model_dump())
+        self.emit("page", {"page": None, "text": text})
+
+    def markdown(self, piece: str):
+        self.emit("markdown", {"markdown": piece})
+
+    def done(self, response: ConversionResponse, progress: ConversionProgress):
+        self.emit("done", {
+            "elapsed_seconds": round(time.perf_counter() - self._started, 3),
+            "pages": progress.pages_total,
+            "chunks": progress.chunks_total,
+            "images": len(response.images),
+            "response": response.model_dump(),
+        })
+
+    def error(self, status_code: int, detail: str):
+        self.emit("error", {"status_code": status_code, "detail": detail})
+
+    def close(self):
+        """Mark the end of the stream."""
+        self._queue.put_nowait(None)
+
+    def _heartbeat(self) -> str:
+        return ": keep-alive\n\n" if self.format == "sse" else self._encode("heartbeat", {})
+
+    async def stream(self, task: asyncio.Task) -> AsyncIterator[str]:
+        """Yield encoded events until ``close``; cancels ``task`` if the client goes away."""
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield self._heartbeat()
+                    continue
+                if item is None:
+                    return
+                yield item
+        finally:
+            if not task.done():
+                task.cancel()
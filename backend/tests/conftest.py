@@ -0,0 +1,16 @@
+"""Test setup: the backend modules read their settings from the environment
+when they are imported, so point every store at a scratch directory first."""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="dokuai-tests-")
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch, "uploads")
+os.environ["CACHE_DIR"] = os.path.join(_scratch, "cache")
+os.environ["POSTGRES_DSN"] = "postgresql://tests@127.0.0.1:1/tests"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["LLM_CACHE_TIERS"] = ""
+os.environ["LLM_TOKENIZER"] = "heuristic"
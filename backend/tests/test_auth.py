@@ -0,0 +1,49 @@
+import time
+
+import jwt
+
+import auth
+from auth import Authenticator, Identity
+
+SECRET = "test-secret-long-enough-for-hs256!"
+
+
+def _token(**claims) -> str:
+    return jwt.encode({"email": "a@example.com", "userId": 7, **claims}, SECRET, algorithm="HS256")
+
+
+def _authenticator(verified: list, **kwargs) -> Authenticator:
+    return Authenticator(secret=SECRET, algorithms=("HS256",), on_verified=verified.append, **kwargs)
+
+
+def test_token_is_verified_once_while_cached():
+    verified = []
+    authenticator = _authenticator(verified, cache_size=10, cache_ttl=300)
+    token = _token()
+
+    assert authenticator.verify(token) == Identity("a@example.com", 7)
+    assert authenticator.verify(token) == Identity("a@example.com", 7)
+    assert len(verified) == 1
+
+
+def test_cached_token_is_verified_again_after_its_exp(monkeypatch):
+    verified = []
+    authenticator = _authenticator(verified, cache_size=10, cache_ttl=300)
+    now = time.time()
+    token = _token(exp=int(now) + 60)
+
+    authenticator.verify(token)
+    # Past the token's exp but well within the cache TTL
+    monkeypatch.setattr(auth.time, "time", lambda: now + 120)
+    authenticator.verify(token)
+
+    assert len(verified) == 2
+
+
+def test_invalid_token_is_not_cached():
+    verified = []
+    authenticator = _authenticator(verified, cache_size=10, cache_ttl=300)
+    token = jwt.encode({"email": "a@example.com"}, "another-secret-long-enough-for-hs256", algorithm="HS256")
+
+    assert authenticator.verify(token) is None
+    assert authenticator._cache == {}
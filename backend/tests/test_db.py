@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from db import ConversionLogWriter
+
+
+class SlowDatabase:
+    """Stands in for Database: each write takes ``delay`` seconds in a worker thread."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.started = asyncio.Event()
+        self.written = []
+
+    async def run(self, fn, batch, known):
+        self.started.set()
+        await asyncio.to_thread(time.sleep, self.delay)
+        self.written.extend(batch)
+        return {email: None for _, email, _, _, _ in batch if email not in known}
+
+
+def test_stop_waits_for_the_flush_in_progress():
+    async def scenario():
+        db = SlowDatabase(0.3)
+        writer = ConversionLogWriter(db, batch_size=10, flush_interval=0, max_queue=10, user_id_ttl=60)
+        writer.start()
+        writer.record("a@example.com", 1, "a.pdf")
+        await db.started.wait()
+        await writer.stop()
+        return db.written
+
+    written = asyncio.run(scenario())
+
+    assert [row[2] for row in written] == ["a.pdf"]
+
+
+def test_stop_gives_up_on_a_flush_after_the_timeout():
+    async def scenario():
+        db = SlowDatabase(1.0)
+        writer = ConversionLogWriter(db, batch_size=10, flush_interval=0, max_queue=10, user_id_ttl=60, shutdown_timeout=0.1)
+        writer.start()
+        writer.record("a@example.com", 1, "a.pdf")
+        await db.started.wait()
+        began = time.monotonic()
+        await writer.stop()
+        return time.monotonic() - began
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_expired_user_ids_are_dropped_at_the_next_flush():
+    async def scenario():
+        writer = ConversionLogWriter(SlowDatabase(0), batch_size=10, flush_interval=0, max_queue=10, user_id_ttl=60)
+        writer.remember_user("old@example.com", 1)
+        writer.remember_user("new@example.com", 2)
+        writer._user_ids["old@example.com"] = (1, time.monotonic() - 1)
+        await writer._flush([(None, "new@example.com", "a.pdf", "pdf", time.time())])
+        return writer._user_ids
+
+    assert set(asyncio.run(scenario())) == {"new@example.com"}
+
+
+def test_looked_up_user_ids_are_cached_on_the_event_loop():
+    async def scenario():
+        writer = ConversionLogWriter(SlowDatabase(0), batch_size=10, flush_interval=0, max_queue=10, user_id_ttl=60)
+        await writer._flush([(None, "unknown@example.com", "a.pdf", "pdf", time.time())])
+        return writer._known_user_ids([(None, "unknown@example.com", "b.pdf", "pdf", time.time())])
+
+    assert asyncio.run(scenario()) == {"unknown@example.com": None}
@@ -0,0 +1,79 @@
+import io
+import re
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from PIL import Image
+
+from docx_markdown import DocxReader
+
+IMAGE = "<<image>>"
+
+
+def _legacy_text(path: str) -> str:
+    """The python-docx extraction DocxReader replaced: top-level paragraphs, runs and images only."""
+    doc = Document(path)
+    rels = doc.part.rels
+    parts = []
+    for para in doc.paragraphs:
+        text = ""
+        for run in para.runs:
+            match = re.search(r'r:embed="(rId[0-9]+)"', run._element.xml)
+            rel = rels.get(match.group(1)) if match else None
+            text += f" {IMAGE} " if rel is not None and rel.reltype == RT.IMAGE else run.text
+        parts.append(text)
+    return "\n\n".join(parts)
+
+
+def _read(path: str) -> str:
+    return DocxReader(path).read(lambda name, ext: IMAGE)
+
+
+def _picture() -> io.BytesIO:
+    out = io.BytesIO()
+    Image.new("RGB", (40, 30), "red").save(out, format="PNG")
+    out.seek(0)
+    return out
+
+
+def test_plain_paragraphs_and_images_match_the_previous_engine(tmp_path):
+    document = Document()
+    paragraph = document.add_paragraph("Plain text with ")
+    paragraph.add_run("several").bold = True
+    paragraph.add_run(" runs.")
+    document.add_picture(_picture())
+    document.add_paragraph("After the image")
+    path = str(tmp_path / "plain.docx")
+    document.save(path)
+
+    assert _read(path) == _legacy_text(path)
+
+
+def test_structure_the_previous_engine_dropped_is_kept_as_markdown(tmp_path):
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = "Header text"
+    document.add_paragraph("Intro")
+    document.add_heading("Section", level=1)
+    document.add_paragraph("one", style="List Bullet")
+    document.add_paragraph("two", style="List Bullet")
+    table = document.add_table(rows=2, cols=2)
+    for (row, col), text in {(0, 0): "a", (0, 1): "b", (1, 0): "1", (1, 1): "2"}.items():
+        table.cell(row, col).text = text
+    document.add_paragraph("Last")
+    path = str(tmp_path / "structured.docx")
+    document.save(path)
+
+    text = _read(path)
+
+    assert text == (
+        "Header text\n\n"
+        "Intro\n\n"
+        "# Section\n\n"
+        "- one\n- two\n\n"
+        "| a | b |\n| --- | --- |\n| 1 | 2 |\n\n"
+        "Last"
+    )
+    # Everything the previous engine found is still there, in the same order
+    position = 0
+    for paragraph in filter(None, _legacy_text(path).split("\n\n")):
+        position = text.index(paragraph, position) + len(paragraph)
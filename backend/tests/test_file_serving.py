@@ -0,0 +1,70 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import file_serving
+from image_store import ImageStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def served(tmp_path):
+    """A client for an app serving ``tmp_path / "uploads"`` like ``/uploads`` in app.py."""
+    root = tmp_path / "uploads"
+    store = ImageStore(str(root), str(tmp_path / "images.sqlite3"), "http://test")
+    url = store.put(PNG, "png")
+    (tmp_path / "secret.txt").write_text("not an upload")
+    app = FastAPI()
+
+    @app.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"])
+    async def serve_file(file_path: str, request: Request):
+        return file_serving.upload_response(request, str(root), file_path)
+
+    return TestClient(app), url.removeprefix("http://test")
+
+
+def test_image_is_served_with_an_immutable_etag(served):
+    client, path = served
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == file_serving.IMMUTABLE_CACHE_CONTROL
+
+
+def test_range_request_gets_partial_content(served):
+    client, path = served
+
+    response = client.get(path, headers={"Range": "bytes=8-15"})
+
+    assert response.status_code == 206
+    assert response.content == PNG[8:16]
+    assert response.headers["content-range"] == f"bytes 8-15/{len(PNG)}"
+
+
+def test_matching_if_none_match_gets_not_modified(served):
+    client, path = served
+    etag = client.get(path).headers["etag"]
+
+    response = client.get(path, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+# Encoded so the client does not normalize the dots away; secret.txt exists next to the upload directory
+@pytest.mark.parametrize("path", ["/uploads/%2e%2e/secret.txt", "/uploads/..%2fsecret.txt", "/uploads/ab/%2e%2e/%2e%2e/secret.txt"])
+def test_paths_outside_the_upload_directory_are_not_found(served, path):
+    client, _ = served
+
+    assert client.get(path).status_code == 404
+
+
+def test_missing_file_is_not_found(served):
+    client, _ = served
+
+    assert client.get("/uploads/ab/cd/missing.png").status_code == 404
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+import formatting
+from config import LLM_MAX_OUTPUT_TOKENS
+from llm_backends import Completion, OpenAICompatibleBackend, StubBackend
+
+
+class TruncatingBackend(StubBackend):
+    """Reports every completion as cut off at ``max_tokens``."""
+
+    def __init__(self, context_tokens: int):
+        super().__init__(formatting.prompt_content, 0, model="echo", context_tokens=context_tokens, max_concurrency=1)
+        self.max_tokens = []
+
+    async def _request(self, client, messages, max_tokens, sampling):
+        self.max_tokens.append(max_tokens)
+        return Completion(formatting.prompt_content(messages[-1]["content"]), 0, max_tokens, "length")
+
+
+def test_truncated_completion_is_retried_within_the_output_cap():
+    # The context has room for far more than LLM_MAX_OUTPUT_TOKENS
+    backend = TruncatingBackend(context_tokens=32768)
+    content = " ".join(["word"] * (LLM_MAX_OUTPUT_TOKENS // 2))
+
+    with pytest.raises(ValueError, match="cut off"):
+        asyncio.run(formatting._format_chunk(content, backend))
+
+    assert len(backend.max_tokens) == 2
+    assert backend.max_tokens[0] < LLM_MAX_OUTPUT_TOKENS
+    assert backend.max_tokens[1] == LLM_MAX_OUTPUT_TOKENS
+
+
+def test_no_retry_when_the_prediction_is_already_at_the_cap():
+    backend = TruncatingBackend(context_tokens=32768)
+    content = " ".join(["word"] * LLM_MAX_OUTPUT_TOKENS)
+
+    with pytest.raises(ValueError, match="cut off"):
+        asyncio.run(formatting._format_chunk(content, backend))
+
+    assert backend.max_tokens == [LLM_MAX_OUTPUT_TOKENS]
+
+
+def test_prompt_fingerprint_covers_the_context_window_and_endpoint():
+    small, large = TruncatingBackend(context_tokens=8192), TruncatingBackend(context_tokens=32768)
+    assert formatting.prompt_fingerprint(small) != formatting.prompt_fingerprint(large)
+
+    local = OpenAICompatibleBackend("openai", "http://localhost:8000/v1", "", "model", 8192, 1)
+    hosted = OpenAICompatibleBackend("openai", "https://api.example.com/v1", "", "model", 8192, 1)
+    assert formatting.prompt_fingerprint(local) != formatting.prompt_fingerprint(hosted)
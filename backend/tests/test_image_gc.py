@@ -0,0 +1,57 @@
+import os
+
+from image_store import ImageStore
+from lineage import LineageIndex, Revision
+from models import ConversionResponse, ImageData
+from result_cache import ConversionCache
+
+
+def _store(tmp_path) -> ImageStore:
+    return ImageStore(str(tmp_path / "uploads"), str(tmp_path / "images.sqlite3"), "http://test")
+
+
+def _exists(store: ImageStore, url: str) -> bool:
+    return os.path.exists(store._path(store.name_from_url(url)))
+
+
+def _response(*urls: str) -> ConversionResponse:
+    return ConversionResponse(
+        markdown="", filename="a.pdf", placeholder_map={},
+        images=[ImageData(data=url, type="image/png", description="") for url in urls],
+    )
+
+
+def test_evicted_result_cache_entry_releases_its_images(tmp_path):
+    store = _store(tmp_path)
+    first, shared, second = store.put(b"first", "png"), store.put(b"shared", "png"), store.put(b"second", "png")
+    cache = ConversionCache(str(tmp_path / "results.sqlite3"), ttl_seconds=3600, max_entries=1, max_bytes=1 << 20, image_store=store)
+
+    cache.put("a", _response(first, shared))
+    assert store.collect_garbage(0) == 1  # only "second" is unreferenced so far
+    assert not _exists(store, second)
+    cache.put("b", _response(shared))  # evicts "a"
+    assert store.collect_garbage(0) == 1
+
+    assert not _exists(store, first)
+    assert _exists(store, shared)
+    cache.close()
+
+
+def test_replaced_lineage_revision_releases_its_images(tmp_path):
+    store = _store(tmp_path)
+    old, kept = store.put(b"old", "png"), store.put(b"kept", "png")
+    index = LineageIndex(str(tmp_path / "lineage.sqlite3"), ttl_seconds=3600, max_entries=10, max_bytes=1 << 20, image_store=store)
+
+    def revision(*urls: str) -> Revision:
+        revision = Revision()
+        for i, url in enumerate(urls):
+            revision.add_page({'fingerprint': str(i), 'needs_ocr': False, 'images': [{'url': url, 'ext': 'png', 'thumbnail': None}]})
+        return revision
+
+    index.save("doc", revision(old, kept))
+    index.save("doc", revision(kept))
+    assert store.collect_garbage(0) == 1
+
+    assert not _exists(store, old)
+    assert _exists(store, kept)
+    index.close()
@@ -0,0 +1,61 @@
+import io
+import os
+import zipfile
+
+from docx import Document
+from PIL import Image
+
+import extraction
+from image_store import get_image_store
+
+
+def _png() -> bytes:
+    image = Image.frombytes("RGB", (400, 400), os.urandom(400 * 400 * 3))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_docx_with_corrupt_image_keeps_its_bytes(tmp_path):
+    png = _png()
+    # Noise does not compress, so cutting the file in half cuts the pixel data
+    data = png[:len(png) // 2]
+    document = Document()
+    document.add_paragraph("Before the image")
+    document.add_picture(io.BytesIO(png))
+    document.add_paragraph("After the image")
+    valid = tmp_path / "valid.docx"
+    document.save(valid)
+    path = tmp_path / "corrupt.docx"
+    with zipfile.ZipFile(valid) as source, zipfile.ZipFile(path, "w") as target:
+        for item in source.infolist():
+            content = source.read(item)
+            target.writestr(item, data if item.filename.startswith("word/media/") else content)
+
+    text, images, _ = extraction.extract_text_and_images_from_docx(str(path), "corrupt")
+
+    assert "Before the image" in text and "After the image" in text
+    assert len(images) == 1
+    image = images[0]
+    # Stored as it is: under its own extension and type, without a thumbnail
+    assert image.data.endswith(".png") and image.type == "image/png"
+    assert image.thumbnail is None
+    store = get_image_store()
+    with open(store._path(store.name_from_url(image.data)), "rb") as f:
+        assert f.read() == data
+
+
+def test_docx_image_is_transcoded_with_a_thumbnail(tmp_path):
+    document = Document()
+    document.add_picture(io.BytesIO(_png()))
+    path = tmp_path / "image.docx"
+    document.save(path)
+
+    _, images, _ = extraction.extract_text_and_images_from_docx(str(path), "image")
+
+    assert len(images) == 1
+    image = images[0]
+    assert image.data.endswith(".webp") and image.type == "image/webp"
+    store = get_image_store()
+    with Image.open(store._path(store.name_from_url(image.thumbnail))) as thumbnail:
+        assert thumbnail.format == "WEBP" and thumbnail.size == (320, 320)
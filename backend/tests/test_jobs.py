@@ -0,0 +1,52 @@
+import asyncio
+import time
+from collections import deque
+
+from jobs import Job, JobManager
+
+
+def test_job_with_user_id_belongs_to_that_id_only():
+    job = Job("a@example.com", 7, "a.pdf", "/tmp/a.pdf", "hash")
+
+    assert job.owned_by("a@example.com", 7)
+    assert not job.owned_by("a@example.com", None)  # the x-user-email header alone is not enough
+    assert not job.owned_by("b@example.com", 8)
+
+
+def test_job_without_user_id_belongs_to_its_email():
+    job = Job("a@example.com", None, "a.pdf", "/tmp/a.pdf", "hash")
+
+    assert job.owned_by("a@example.com", None)
+    assert not job.owned_by("b@example.com", None)
+
+
+def test_duplicate_upload_joins_only_its_owners_job(tmp_path):
+    async def runner(job):
+        return None
+
+    async def scenario():
+        manager = JobManager(runner, max_concurrent=1, max_active_per_user=5, max_submissions_per_minute=5, result_ttl=60)
+        spooled = tmp_path / "a.pdf"
+        spooled.write_bytes(b"%PDF")
+        job = manager.submit("a@example.com", 7, "a.pdf", str(spooled), "hash")
+        found = (
+            manager.find_duplicate("a@example.com", 7, "hash"),
+            manager.find_duplicate("a@example.com", None, "hash"),  # same email from the header only
+        )
+        await manager.shutdown()
+        return job, found
+
+    job, (owner, spoofed) = asyncio.run(scenario())
+
+    assert owner is job
+    assert spoofed is None
+
+
+def test_stale_submission_times_are_forgotten():
+    manager = JobManager(None, max_concurrent=1, max_active_per_user=5, max_submissions_per_minute=5, result_ttl=60)
+    manager._submissions["a@example.com"] = deque([time.monotonic() - 120])
+    manager._submissions["b@example.com"] = deque([time.monotonic()])
+
+    manager._prune()
+
+    assert list(manager._submissions) == ["b@example.com"]
@@ -0,0 +1,92 @@
+import asyncio
+
+import fitz
+import pytest
+
+import extraction
+import formatting
+import pipeline
+from lineage import LineageIndex
+from llm_backends import StubBackend
+from workers import ExtractionPool
+
+
+def _pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    return str(path)
+
+
+def _index(tmp_path) -> LineageIndex:
+    return LineageIndex(str(tmp_path / "lineage.sqlite3"), ttl_seconds=3600, max_entries=10, max_bytes=1 << 20)
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_revised_pdf_reuses_its_unchanged_pages(tmp_path, pool):
+    first = _pdf(tmp_path / "v1.pdf", ["Introduction", "Methods", "Results"])
+    # A page inserted in front and the last page edited
+    second = _pdf(tmp_path / "v2.pdf", ["Preface", "Introduction", "Methods", "Results, revised"])
+    index = _index(tmp_path)
+
+    async def scenario():
+        revision = index.load("manual")
+        await pipeline.extract_pdf(pool, first, revision=revision)
+        index.save("manual", revision)
+        revision = index.load("manual")
+        revised = await pipeline.extract_pdf(pool, second, revision=revision)
+        fresh = await pipeline.extract_pdf(pool, second)
+        return revision, revised, fresh
+
+    revision, revised, fresh = asyncio.run(scenario())
+
+    assert revision.pages_reused == 2
+    assert revised[0] == fresh[0]
+
+
+def test_page_fingerprints_change_with_the_extraction_settings(tmp_path, monkeypatch):
+    path = _pdf(tmp_path / "doc.pdf", ["Introduction", "Methods"])
+    before = extraction.pdf_page_fingerprints(path, 1, 2)
+
+    monkeypatch.setattr(extraction, "EXTRACTION_SETTINGS", extraction.EXTRACTION_SETTINGS + "columns=changed\n")
+
+    assert set(extraction.pdf_page_fingerprints(path, 1, 2)).isdisjoint(before)
+
+
+class CountingBackend(StubBackend):
+    def __init__(self, model: str):
+        super().__init__(formatting.prompt_content, 0, model=model, context_tokens=8192, max_concurrency=1)
+        self.requests = 0
+
+    async def _request(self, client, messages, max_tokens, sampling):
+        self.requests += 1
+        return await super()._request(client, messages, max_tokens, sampling)
+
+
+def test_unchanged_chunks_are_reused_until_the_formatter_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(formatting, "_format_locally", lambda chunk: False)
+    text = "Some paragraph of the document that the model formats."
+    index = _index(tmp_path)
+
+    def convert(backend):
+        revision = index.load("notes")
+        markdown, complete = asyncio.run(formatting.format_document(text, [], "notes.txt", revision=revision, backend=backend))
+        assert complete
+        index.save("notes", revision)
+        return markdown
+
+    first = CountingBackend("echo")
+    markdown = convert(first)
+    again = CountingBackend("echo")
+    assert convert(again) == markdown
+    other_model = CountingBackend("other")
+    convert(other_model)
+
+    assert (first.requests, again.requests, other_model.requests) == (1, 0, 1)
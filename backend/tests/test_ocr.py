@@ -0,0 +1,51 @@
+import io
+import os
+import time
+
+import fitz
+from PIL import Image
+
+import extraction
+import ocr
+from lineage import Revision
+
+
+def test_ocr_cache_evicts_least_recently_used_pages_over_its_size(tmp_path):
+    block = (0.0, 0.0, 100.0, 20.0, "x" * 1000)
+    cache = ocr.OcrCache(str(tmp_path / "ocr.sqlite3"), ttl_seconds=3600, max_bytes=2500)
+
+    cache.put("a", [block])
+    cache.put("b", [block])
+    time.sleep(0.01)
+    assert cache.get("a") is not None  # now more recently used than "b"
+    cache.put("c", [block])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_ocr_cache_entries_expire(tmp_path):
+    cache = ocr.OcrCache(str(tmp_path / "ocr.sqlite3"), ttl_seconds=0, max_bytes=1 << 20)
+    cache.put("a", [(0.0, 0.0, 1.0, 1.0, "text")])
+    time.sleep(0.01)
+
+    assert cache.get("a") is None
+
+
+def test_page_whose_ocr_failed_is_not_kept_for_reuse(tmp_path, monkeypatch):
+    # A scan: one image and no text layer
+    scan = Image.frombytes("RGB", (200, 200), os.urandom(200 * 200 * 3))
+    out = io.BytesIO()
+    scan.save(out, format="PNG")
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(0, 0, 200, 200), stream=out.getvalue())
+    path = str(tmp_path / "scan.pdf")
+    doc.save(path)
+    monkeypatch.setattr(ocr, "ocr_page", lambda doc, page, page_num: None)
+
+    page = extraction.ocr_pdf_page(path, 1)
+    revision = Revision()
+    revision.add_page(page)
+
+    assert page['needs_ocr']
+    assert revision.pages == {}
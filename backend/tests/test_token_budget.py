@@ -0,0 +1,36 @@
+import base64
+
+import pytest
+
+import token_budget
+
+tiktoken = pytest.importorskip("tiktoken")
+
+
+@pytest.fixture
+def offline_tokenizer(tmp_path, monkeypatch):
+    """cl100k_base with an empty tiktoken cache and downloads turned into failures."""
+    def download(*args, **kwargs):
+        pytest.fail("the tokenizer tried to download its BPE file")
+
+    monkeypatch.setattr("requests.get", download)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path / "tiktoken"))
+    monkeypatch.setattr(token_budget, "LLM_TOKENIZER", "cl100k_base")
+    token_budget._encoding.cache_clear()
+    yield tmp_path
+    token_budget._encoding.cache_clear()
+
+
+def test_missing_bpe_file_falls_back_to_the_heuristic(offline_tokenizer):
+    assert token_budget._encoding() is None
+    assert token_budget.count_tokens("Hello world, 12345") == 5
+    assert token_budget.settings_fingerprint().startswith("tokenizer=heuristic:")
+
+
+def test_configured_bpe_file_is_checked_against_the_encoding(offline_tokenizer, monkeypatch):
+    path = offline_tokenizer / "cl100k_base.tiktoken"
+    path.write_bytes(base64.b64encode(b"a") + b" 0\n")
+    monkeypatch.setattr(token_budget, "LLM_TOKENIZER_FILE", str(path))
+
+    assert token_budget._encoding() is None  # not cl100k_base's file
+    assert tiktoken.load.read_file is not token_budget._read_bpe_file
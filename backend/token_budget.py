@@ -0,0 +1,126 @@
+"""Token counting and request budgeting for LLM formatting.
+
+Word counts undercount code, URLs, numbers and non-English text, so requests
+sized by them overflow the context window or get capped too early. Tokens
+are counted with tiktoken (``LLM_TOKENIZER``, an encoding close to the
+models' own) when it is installed and the encoding's BPE file is available
+locally, in tiktoken's cache (``TIKTOKEN_CACHE_DIR``) or as
+``LLM_TOKENIZER_FILE``; it is never downloaded. Otherwise, and with
+``LLM_TOKENIZER=heuristic``, tokens are estimated by a regular expression
+that errs on the high side: short letter runs, groups of up to three digits,
+runs of punctuation and every non-ASCII character each count as a token.
+
+A request's budget follows from the model's context window: chunks are
+sized so that the prompt plus the predicted completion
+(``LLM_OUTPUT_RATIO`` tokens per content token) fit, and ``max_tokens`` is
+set to that prediction instead of a fixed cap. ``content_preserved`` checks
+one chunk's output against its input.
+"""
+import functools
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import List, Sequence
+
+from config import LLM_MAX_OUTPUT_TOKENS, LLM_MIN_CONTENT_RATIO, LLM_OUTPUT_RATIO, LLM_TOKENIZER, LLM_TOKENIZER_FILE
+
+try:
+    import tiktoken
+    import tiktoken.load
+except ImportError:  # optional: token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens kept free in every request, as a margin for counting errors
+SAFETY_TOKENS = 100
+# Completion tokens allowed on top of the prediction
+OUTPUT_SLACK_TOKENS = 200
+MIN_CHUNK_TOKENS = 200
+
+_TOKEN_RE = re.compile(r'[A-Za-z]{1,6}|[0-9]{1,3}|[^\x00-\x7f]|_+|[^\w\s]{1,3}|\n+')
+_WORD_RE = re.compile(r'\w+')
+_encoding_lock = threading.Lock()
+
+
+def _read_bpe_file(blobpath: str) -> bytes:
+    # Stands in for tiktoken's downloader, which it calls for files missing from its cache
+    if not LLM_TOKENIZER_FILE:
+        raise FileNotFoundError(f"{blobpath} is neither in the tiktoken cache nor set as LLM_TOKENIZER_FILE")
+    with open(LLM_TOKENIZER_FILE, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    if LLM_TOKENIZER == "heuristic" or tiktoken is None:
+        return None
+    with _encoding_lock:
+        download, tiktoken.load.read_file = tiktoken.load.read_file, _read_bpe_file
+        try:
+            # tiktoken still checks the file against the encoding's known hash
+            return tiktoken.get_encoding(LLM_TOKENIZER)
+        except Exception as e:  # unknown encoding, or its BPE file is not available
+            logger.warning(f"Tokenizer {LLM_TOKENIZER!r} is unavailable, estimating token counts: {str(e)}")
+            return None
+        finally:
+            tiktoken.load.read_file = download
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in ``text``."""
+    encoding = _encoding()
+    if encoding is None:
+        return len(_TOKEN_RE.findall(text))
+    return len(encoding.encode_ordinary(text))
+
+
+def count_tokens_many(texts: Sequence[str]) -> List[int]:
+    """Token counts of all ``texts``, encoded as one batch."""
+    encoding = _encoding()
+    if encoding is None:
+        return [len(_TOKEN_RE.findall(text)) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def settings_fingerprint() -> str:
+    """Identifies the settings that decide how documents are chunked and their requests budgeted."""
+    tokenizer = LLM_TOKENIZER if _encoding() is not None else "heuristic"
+    return (
+        f"tokenizer={tokenizer}:output_ratio={LLM_OUTPUT_RATIO}:max_output={LLM_MAX_OUTPUT_TOKENS}"
+        f":min_content={LLM_MIN_CONTENT_RATIO}"
+    )
+
+
+def chunk_token_budget(context_tokens: int, prompt_tokens: int, max_chunk_tokens: int, max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS) -> int:
+    """Largest chunk whose request (``prompt_tokens`` besides the chunk) and predicted completion fit the model."""
+    room = context_tokens - prompt_tokens - SAFETY_TOKENS
+    fit = min(room / (1 + LLM_OUTPUT_RATIO), (max_output_tokens - OUTPUT_SLACK_TOKENS) / LLM_OUTPUT_RATIO)
+    return max(MIN_CHUNK_TOKENS, min(max_chunk_tokens, int(fit)))
+
+
+def completion_limit(prompt_tokens: int, context_tokens: int, max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS) -> int:
+    """Most ``max_tokens`` a request may ask for: the room the context leaves, up to ``max_output_tokens``."""
+    return min(context_tokens - prompt_tokens - SAFETY_TOKENS, max_output_tokens)
+
+
+def completion_budget(content_tokens: int, prompt_tokens: int, context_tokens: int, max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS) -> int:
+    """``max_tokens`` for a request: the predicted completion, within ``completion_limit``."""
+    predicted = math.ceil(content_tokens * LLM_OUTPUT_RATIO) + OUTPUT_SLACK_TOKENS
+    return min(completion_limit(prompt_tokens, context_tokens, max_output_tokens), predicted)
+
+
+def content_preserved(source: str, output: str, min_ratio: float = LLM_MIN_CONTENT_RATIO) -> bool:
+    """Whether ``output`` keeps at least ``min_ratio`` of the words of ``source``.
+
+    Words are compared as a multiset, case-insensitively, so markup, moved
+    text and changed whitespace do not count as losses.
+    """
+    words = Counter(word.lower() for word in _WORD_RE.findall(source))
+    total = sum(words.values())
+    if not total:
+        return True
+    kept = words & Counter(word.lower() for word in _WORD_RE.findall(output))
+    return sum(kept.values()) >= min_ratio * total
@@ -0,0 +1,175 @@
+"""Image transcoding and thumbnails.
+
+Documents embed images in whatever format their author used: multi-megabyte
+PNG screenshots, JPEG 2000, camera-sized photos. Every image is also served
+to the frontend, so extracted images are re-encoded to ``IMAGE_FORMAT``
+(WebP by default), downscaled to ``IMAGE_MAX_DIMENSION`` and get a
+``IMAGE_THUMBNAIL_SIZE`` thumbnail.
+
+Images are decoded once, when they are extracted, and resized and encoded
+to each output on the image writer threads of the extraction workers (Pillow
+releases the GIL while decoding, resizing and encoding). Transcoded images
+are stored under a hash of the source bytes and the settings, so an image
+seen before is never encoded again: the writer finds the file and skips it.
+Images Pillow cannot decode (e.g. JBIG2, or a corrupt or truncated body),
+animations, bilevel scans and images already in the target format and size
+are stored unchanged, and corrupt ones get no thumbnail.
+"""
+import functools
+import io
+import logging
+from typing import Callable, Optional, Tuple
+
+from PIL import Image
+
+import metrics
+from config import IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_QUALITY, IMAGE_THUMBNAIL_SIZE
+from image_store import WriteBatch
+
+logger = logging.getLogger(__name__)
+
+# IMAGE_FORMAT value -> (Pillow format, file extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "avif": ("AVIF", "avif"),
+    "jpeg": ("JPEG", "jpeg"),
+}
+
+# Used for thumbnails when IMAGE_FORMAT is "original"
+THUMBNAIL_FALLBACK_FORMAT = "webp"
+
+
+@functools.lru_cache(maxsize=None)
+def output_format() -> Optional[str]:
+    """The configured output format, or None to keep images as they are."""
+    name = IMAGE_FORMAT.lower()
+    if name == "original":
+        return None
+    if name not in FORMATS:
+        logger.warning(f"Unknown IMAGE_FORMAT {IMAGE_FORMAT!r}, keeping images in their original format")
+        return None
+    Image.init()
+    if FORMATS[name][0] not in Image.SAVE:
+        logger.warning(f"This Pillow build cannot write {name}, using webp instead")
+        return "webp"
+    return name
+
+
+def _variant(kind: str, fmt: str, size: int) -> bytes:
+    # Part of the stored name, so changing a setting produces new files
+    return f"{kind}:{fmt}:q{IMAGE_QUALITY}:{size}\0".encode()
+
+
+def _prepare(image: Image.Image, fmt: str) -> Image.Image:
+    """Convert ``image`` to a mode ``fmt`` can store."""
+    if fmt != "jpeg":
+        if image.mode in ("RGB", "RGBA"):
+            return image
+        return image.convert("RGBA" if image.has_transparency_data else "RGB")
+    if image.has_transparency_data:
+        # JPEG has no alpha channel: flatten onto white like a browser would
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, "white")
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+
+def _fit(image: Image.Image, max_size: int) -> Image.Image:
+    """``image`` scaled down to fit ``max_size`` pixels (0: any size), as a new image if it is scaled."""
+    if not max_size or max(image.size) <= max_size:
+        return image
+    scale = max_size / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def encode(image: Image.Image, fmt: str, max_size: int) -> bytes:
+    """Fit the decoded ``image`` into ``max_size`` pixels (0: any size) and encode it as ``fmt``.
+
+    ``image`` itself is not modified, so one decoded image can be encoded
+    to several sizes at once.
+    """
+    with metrics.timed("image_transcode"):
+        image = _fit(_prepare(image, fmt), max_size)
+        out = io.BytesIO()
+        if fmt == "jpeg":
+            image.save(out, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(out, format=FORMATS[fmt][0], quality=IMAGE_QUALITY)
+        return out.getvalue()
+
+
+def _decode(data: bytes, max_size: int) -> Image.Image:
+    """Decode ``data`` at no less than ``max_size`` pixels (0: full size)."""
+    with metrics.timed("image_decode"), Image.open(io.BytesIO(data)) as image:
+        if max_size:
+            # JPEGs can be decoded at a fraction of their size, which is much faster
+            image.draft(None, (max_size, max_size))
+        image.load()
+        return image
+
+
+def _encode_from(source: Callable[[], Image.Image], fmt: str, max_size: int) -> bytes:
+    return encode(source(), fmt, max_size)
+
+
+def save_image(batch: WriteBatch, data: bytes, ext: str) -> Tuple[str, str, Optional[str]]:
+    """Queue an extracted image on ``batch``, transcoded as configured.
+
+    Returns the image URL, the extension of the stored image (without dot)
+    and the URL of its thumbnail (None if it has none).
+    """
+    ext = ext.lower().lstrip(".")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Only the header is read here
+            width, height = image.size
+            mode = image.mode
+            source_format = image.format
+            animated = getattr(image, "is_animated", False)
+    except Exception:
+        return batch.submit(data, ext), ext, None
+    if animated:
+        return batch.submit(data, ext), ext, None
+
+    largest = max(width, height)
+    fmt = output_format()
+    thumbnail_size = IMAGE_THUMBNAIL_SIZE if IMAGE_THUMBNAIL_SIZE and largest > IMAGE_THUMBNAIL_SIZE else 0
+    resize = bool(IMAGE_MAX_DIMENSION) and largest > IMAGE_MAX_DIMENSION
+    keep = fmt is None or mode == "1" or (source_format == FORMATS[fmt][0] and not resize)
+    if keep and not thumbnail_size:
+        return batch.submit(data, ext), ext, None
+
+    store = batch.writer.store
+    thumb_fmt = fmt or THUMBNAIL_FALLBACK_FORMAT
+    outputs = []  # (name, format, size)
+    if thumbnail_size:
+        name = store.name_for(data, FORMATS[thumb_fmt][1], _variant("thumbnail", thumb_fmt, thumbnail_size))
+        outputs.append((name, thumb_fmt, thumbnail_size))
+    if not keep:
+        name = store.name_for(data, FORMATS[fmt][1], _variant("image", fmt, IMAGE_MAX_DIMENSION))
+        outputs.append((name, fmt, IMAGE_MAX_DIMENSION))
+    draft = thumbnail_size if keep else IMAGE_MAX_DIMENSION if resize else 0
+    if all(store.exists(name) for name, _, _ in outputs):
+        # Transcoded before: nothing to decode unless a file vanishes meanwhile
+        source = functools.partial(_decode, data, draft)
+    else:
+        try:
+            # Decoded before any URL is handed out, so a corrupt body is stored
+            # as it is, under its own extension. Resizing and encoding are left
+            # to the writer threads.
+            decoded = _decode(data, draft)
+        except Exception as e:
+            logger.warning(f"Cannot decode {source_format} image, storing it unchanged: {str(e)}")
+            return batch.submit(data, ext), ext, None
+        source = lambda: decoded  # noqa: E731
+
+    urls = [
+        batch.submit_derived(name, functools.partial(_encode_from, source, out_fmt, size))
+        for name, out_fmt, size in outputs
+    ]
+    thumbnail = urls.pop(0) if thumbnail_size else None
+    if keep:
+        return batch.submit(data, ext), ext, thumbnail
+    return urls[0], FORMATS[fmt][1], thumbnail
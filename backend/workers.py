@@ -0,0 +1,206 @@
+"""Process-pool tier for CPU-bound document extraction.
+
+PyMuPDF and python-docx parsing is pure CPU work; running it on the event loop
+stalls every other request (``/api/health`` included) for the length of the
+conversion. ``ExtractionPool`` hands those jobs to worker processes while
+keeping the number of waiting jobs bounded, abandoning jobs that exceed a
+timeout and recycling workers after a fixed number of jobs so PyMuPDF memory
+growth cannot accumulate forever.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+import metrics
+from config import (
+    EXTRACTION_JOBS_PER_WORKER,
+    EXTRACTION_QUEUE_SIZE,
+    EXTRACTION_TIMEOUT,
+    EXTRACTION_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionPoolFull(Exception):
+    """Raised when the extraction queue is full and a job cannot be accepted."""
+
+
+class ExtractionTimeout(Exception):
+    """Raised when an extraction job runs longer than the configured timeout."""
+
+
+def _init_worker():
+    """Configure logging and metrics in freshly started worker processes."""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        )
+    # Forked workers inherit the app's counters; only report their own
+    metrics.drain()
+
+
+class _Generation:
+    """One ProcessPoolExecutor plus the bookkeeping needed to retire it."""
+
+    def __init__(self, max_workers: int):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+        self.submitted = 0
+        self.active: Set[Future] = set()
+        self.retired = False
+        self.poisoned = False
+        self.processes = []
+
+    def retire(self):
+        """Stop accepting jobs; workers exit once their current jobs finish."""
+        self.retired = True
+        # shutdown() drops the executor's process table, keep handles for terminate()
+        self.processes = list((getattr(self.executor, "_processes", None) or {}).values())
+        self.executor.shutdown(wait=False)
+
+    def terminate(self):
+        # ProcessPoolExecutor offers no public way to kill a running job, so a
+        # poisoned generation has its processes terminated once it is idle.
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+
+
+class ExtractionPool:
+    """Bounded, self-recycling process pool for extraction jobs."""
+
+    def __init__(
+        self,
+        max_workers: int = EXTRACTION_WORKERS,
+        max_queue: int = EXTRACTION_QUEUE_SIZE,
+        job_timeout: float = EXTRACTION_TIMEOUT,
+        jobs_per_worker: int = EXTRACTION_JOBS_PER_WORKER,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.job_timeout = job_timeout
+        self.jobs_per_generation = max(1, jobs_per_worker) * self.max_workers
+        self._lock = threading.Lock()
+        self._generation: Optional[_Generation] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        """Jobs currently running or waiting for a worker."""
+        return self._pending
+
+    def _current_generation(self) -> _Generation:
+        with self._lock:
+            gen = self._generation
+            if gen is None or gen.retired or gen.submitted >= self.jobs_per_generation:
+                if gen is not None:
+                    self._retire(gen)
+                gen = _Generation(self.max_workers)
+                self._generation = gen
+                logger.info(f"Started extraction worker pool with {self.max_workers} workers")
+            return gen
+
+    def _retire(self, gen: _Generation):
+        """Stop routing jobs to ``gen``; its workers exit once their jobs finish."""
+        if gen is self._generation:
+            self._generation = None
+        if not gen.retired:
+            gen.retire()
+
+    def _job_done(self, gen: _Generation, future: Future):
+        with self._lock:
+            gen.active.discard(future)
+            if gen.poisoned and not gen.active:
+                gen.terminate()
+
+    def _admit(self):
+        if self._closed:
+            raise RuntimeError("Extraction pool is shut down")
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ExtractionPoolFull("Too many documents are being processed, please retry shortly")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def _execute(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        async with self._slots:
+            gen = self._current_generation()
+            instrumented = metrics.ENABLED
+            with self._lock:
+                if instrumented:
+                    # Bring back what the job recorded in the worker's registry
+                    future = gen.executor.submit(metrics.run_and_drain, fn, *args)
+                else:
+                    future = gen.executor.submit(fn, *args)
+                gen.submitted += 1
+                gen.active.add(future)
+            future.add_done_callback(lambda f, g=gen: self._job_done(g, f))
+            try:
+                with metrics.IN_FLIGHT.track("extraction_job"):
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.job_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Extraction job {getattr(fn, '__name__', fn)} timed out after {self.job_timeout}s")
+                with self._lock:
+                    # The stuck worker cannot be interrupted; stop feeding its pool
+                    # and kill it once the other jobs on it have completed.
+                    gen.active.discard(future)
+                    gen.poisoned = True
+                    self._retire(gen)
+                    if not gen.active:
+                        gen.terminate()
+                raise ExtractionTimeout(f"Extraction did not finish within {self.job_timeout:.0f} seconds")
+            if instrumented:
+                result, recorded = result
+                metrics.merge(recorded)
+            return result
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in a worker process and return its result.
+
+        Raises:
+            ExtractionPoolFull: if too many jobs are already waiting
+            ExtractionTimeout: if the job exceeds the configured timeout
+        """
+        self._admit()
+        self._pending += 1
+        try:
+            return await self._execute(fn, args)
+        finally:
+            self._pending -= 1
+
+    async def run_many(
+        self,
+        fn: Callable[..., Any],
+        arg_list: Iterable[Tuple[Any, ...]],
+        on_result: Optional[Callable[[Any], None]] = None,
+    ) -> List[Any]:
+        """Run ``fn`` once per argument tuple in parallel; results keep input order.
+
+        The whole batch is admitted as a single queued job, so one sharded
+        document is never half accepted when the queue fills up.
+        ``on_result`` is called with each result as soon as it arrives.
+        """
+        async def execute(args):
+            result = await self._execute(fn, tuple(args))
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        self._admit()
+        self._pending += 1
+        try:
+            return list(await asyncio.gather(*(execute(args) for args in arg_list)))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        """Stop the current worker pool; called on application shutdown."""
+        self._closed = True
+        with self._lock:
+            if self._generation is not None:
+                self._generation.executor.shutdown(wait=False, cancel_futures=True)
+                self._generation = None